@@ -0,0 +1,185 @@
+import numpy
+from glyph import *
+from font import Font
+
+class FontAtlas:
+    # Glyphs are stored as rows of their big-endian word bytes, which is
+    # exactly the MSB-first bit order of `numpy.packbits`, so any glyph
+    # shape packs and unpacks in one vectorized call.
+
+    def __init__(self,
+        ordinals: numpy.ndarray,
+        rows: numpy.ndarray,
+        shape: GlyphShape = Glyph.DefaultShape,
+    ) -> None:
+        self._ordinals = numpy.ascontiguousarray(ordinals, dtype=numpy.uint32)
+        self._shape = shape
+        self._rows = numpy.ascontiguousarray(rows, dtype=numpy.uint8).reshape(-1, shape.wordBytes) & FontAtlas._mask(shape)
+
+    @staticmethod
+    def _mask(shape: GlyphShape) -> numpy.ndarray:
+        return numpy.frombuffer(shape.wordMask.to_bytes(shape.wordBytes, 'big'), dtype=numpy.uint8)
+
+    @staticmethod
+    def fromFont(font: Font) -> 'FontAtlas':
+        # Leaves glyphs of a mapped container undecoded.
+        return FontAtlas(
+            numpy.fromiter(font._ordinals, dtype=numpy.uint32, count=font.glyphCount()),
+            numpy.frombuffer(font.wordData(), dtype=numpy.uint8),
+            font.shape(),
+        )
+
+    @staticmethod
+    def fromWords(
+        ordinals: numpy.ndarray,
+        words: numpy.ndarray,
+        shape: GlyphShape = Glyph.DefaultShape,
+    ) -> 'FontAtlas':
+        # Packed words of at most 32 bits, as in the exported uint arrays.
+        words = numpy.asarray(words, dtype='>u4').reshape(-1, 1).view(numpy.uint8)
+        return FontAtlas(ordinals, words[:, 4 - shape.wordBytes:], shape)
+
+    @staticmethod
+    def fromCube(
+        ordinals: numpy.ndarray,
+        cube: numpy.ndarray,
+    ) -> 'FontAtlas':
+        cube = numpy.asarray(cube, dtype=bool)
+        return FontAtlas(ordinals, FontAtlas.pack(cube), GlyphShape(cube.shape[2], cube.shape[1]))
+
+    def toFont(self) -> Font:
+        font = Font([], self._shape)
+        data = self._rows.tobytes()
+        size = self._shape.wordBytes
+        font._setGlyphs(map(
+            lambda ordinal, offset: Glyph.withWord(ordinal, int.from_bytes(data[offset:offset + size], 'big'), self._shape),
+            self._ordinals.tolist(),
+            range(0, len(data), size),
+        ))
+        return font
+
+    @staticmethod
+    def pack(cube: numpy.ndarray) -> numpy.ndarray:
+        cube = numpy.asarray(cube, dtype=bool)
+        return numpy.packbits(cube.reshape(len(cube), -1), axis=1)
+
+    @staticmethod
+    def unpack(
+        rows: numpy.ndarray,
+        shape: GlyphShape = Glyph.DefaultShape,
+    ) -> numpy.ndarray:
+        bits = numpy.unpackbits(numpy.asarray(rows, dtype=numpy.uint8).reshape(-1, shape.wordBytes), axis=1, count=shape.pixelCount)
+        return bits.astype(bool).reshape(-1, shape.height, shape.width)
+
+    def shape(self) -> GlyphShape:
+        return self._shape
+
+    def ordinals(self) -> numpy.ndarray:
+        return self._ordinals
+
+    def rows(self) -> numpy.ndarray:
+        return self._rows
+
+    def words(self) -> numpy.ndarray:
+        if self._shape.wordBits > 32:
+            raise ValueError('{} glyphs do not fit a 32 bit word.'.format(self._shape))
+        padded = numpy.zeros((len(self._rows), 4), dtype=numpy.uint8)
+        padded[:, 4 - self._shape.wordBytes:] = self._rows
+        return padded.view('>u4').ravel().astype(numpy.uint32)
+
+    def cube(self) -> numpy.ndarray:
+        return FontAtlas.unpack(self._rows, self._shape)
+
+    def glyphCount(self) -> int:
+        return len(self._ordinals)
+
+    def _withCube(self, cube: numpy.ndarray) -> 'FontAtlas':
+        return FontAtlas(self._ordinals.copy(), FontAtlas.pack(cube), self._shape)
+
+    def invert(self) -> 'FontAtlas':
+        return FontAtlas(self._ordinals.copy(), ~self._rows, self._shape)
+
+    def shift(self,
+        dx: int,
+        dy: int,
+    ) -> 'FontAtlas':
+        return self._withCube(FontAtlas._shifted(self.cube(), dx, dy))
+
+    def mirror(self,
+        horizontal: bool = True,
+        vertical: bool = False,
+    ) -> 'FontAtlas':
+        cube = self.cube()
+        if horizontal:
+            cube = cube[:, :, ::-1]
+        if vertical:
+            cube = cube[:, ::-1, :]
+        return self._withCube(cube)
+
+    def embolden(self,
+        dx: int = 1,
+        dy: int = 0,
+    ) -> 'FontAtlas':
+        cube = self.cube()
+        return self._withCube(cube | FontAtlas._shifted(cube, dx, dy))
+
+    def popcount(self) -> numpy.ndarray:
+        return self.cube().sum(axis=(1, 2))
+
+    def boundingBoxes(self) -> numpy.ndarray:
+        # One (x0, y0, x1, y1) row per glyph with inclusive bounds, -1 for empty glyphs.
+        cube = self.cube()
+        columns = cube.any(axis=1)
+        rows = cube.any(axis=2)
+        boxes = numpy.stack((
+            columns.argmax(axis=1),
+            rows.argmax(axis=1),
+            self._shape.width - 1 - columns[:, ::-1].argmax(axis=1),
+            self._shape.height - 1 - rows[:, ::-1].argmax(axis=1),
+        ), axis=1)
+        boxes[~columns.any(axis=1)] = -1
+        return boxes
+
+    @staticmethod
+    def _shifted(
+        cube: numpy.ndarray,
+        dx: int,
+        dy: int,
+    ) -> numpy.ndarray:
+        result = numpy.zeros_like(cube)
+        height, width = cube.shape[1:]
+        if abs(dx) >= width or abs(dy) >= height:
+            return result
+        result[:, max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+            cube[:, max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)]
+        return result
+
+if __name__ == '__main__':
+    font = Font()
+    font.glyphWithOrdinal(ord('a')).toggle(1, 2, True)
+    font.glyphWithOrdinal(ord('a')).toggle(3, 4, True)
+
+    atlas = FontAtlas.fromFont(font)
+    assert atlas.cube()[ord('a') - 32, 2, 1]
+    assert (FontAtlas.pack(atlas.cube()) == atlas.rows()).all()
+    assert atlas.words().tolist() == [glyph.toUnsignedInt() for glyph in font.sortedGlyphs()]
+    assert (FontAtlas.fromWords(atlas.ordinals(), atlas.words()).rows() == atlas.rows()).all()
+    assert atlas.toFont().toBytes() == font.toBytes()
+
+    index = ord('a') - 32
+    assert atlas.popcount()[index] == 2
+    assert atlas.boundingBoxes()[index].tolist() == [1, 2, 3, 4]
+    assert atlas.boundingBoxes()[0].tolist() == [-1, -1, -1, -1]
+    assert atlas.invert().popcount()[index] == Glyph.PixelCount - 2
+    assert atlas.shift(1, -1).cube()[index, 1, 2]
+    assert atlas.mirror().cube()[index, 2, Glyph.Width - 2]
+    assert atlas.embolden().popcount()[index] == 4
+    assert atlas.invert().toFont().glyphWithOrdinal(ord('a')).isOn(0, 0)
+
+    font.setShape(GlyphShape(9, 7))
+    atlas = FontAtlas.fromFont(font)
+    assert atlas.cube().shape == (font.glyphCount(), 7, 9)
+    assert atlas.toFont().toBytes() == font.toBytes()
+    assert FontAtlas.fromCube(atlas.ordinals(), atlas.cube()).toFont().toBytes() == font.toBytes()
+    assert atlas.mirror().cube()[index, 2, 9 - 2]
+    assert atlas.invert().popcount()[index] == 9 * 7 - 2
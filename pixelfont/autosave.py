@@ -0,0 +1,502 @@
+import struct
+from contextlib import suppress
+from os import fsync, getpid, listdir, makedirs, remove, replace
+from os.path import exists, getmtime, join
+from queue import Queue
+from sys import stderr
+from threading import Thread
+from time import time_ns
+from typing import BinaryIO, Callable, List, Optional, Tuple, Union
+from zlib import crc32
+from glyph import Glyph, GlyphShape
+from font import Font
+from text import Text
+from codec import encodeFont, encodeLines
+
+# Crash-safe autosave. Edits are appended to a journal by a worker thread,
+# so the GUI thread only queues each edit. Every editor has its
+# own session, and every compaction starts a new generation of it:
+#
+#   <name>.lock               held open and locked while the session lives
+#   <name>-<generation>.apf   font snapshot
+#   <name>-<generation>.att   text snapshot
+#   <name>-<generation>.apj   edits since the snapshot
+#
+# Only sessions whose lock nobody holds are recovered, so editors running
+# side by side leave each other's files alone. A generation that cannot
+# be read is renamed to *.bad instead of failing every start.
+#
+# Each file is written under a temporary name and renamed into place, the
+# journal last, so the newest generation with a journal is always complete.
+# Journal records are
+#
+#   '<BIH'   kind, ordinal or line index, payload size
+#   payload  big-endian glyph word of whole bytes or ASCII line
+#   '<I'     crc32 of the header and payload
+#
+# and a torn record at the end, left by a crash mid-write, ends replay. A
+# journal starts with the snapshot's line count, as the zero padding of an
+# .att file reads back as extra empty lines.
+
+Record = struct.Struct('<BIH')
+Checksum = struct.Struct('<I')
+
+SetGlyph = 0
+InsertLine = 1
+SetLine = 2
+RemoveLine = 3
+LineCount = 4
+
+FontExtension = '.apf'
+TextExtension = '.att'
+JournalExtension = '.apj'
+
+# Messages to the worker thread.
+AppendMessage = 0
+SnapshotMessage = 1
+CloseMessage = 2
+
+def encodeRecord(kind: int, index: int, payload: bytes = b'') -> bytes:
+    header = Record.pack(kind, index, len(payload))
+    return header + payload + Checksum.pack(crc32(header + payload))
+
+def decodeRecords(data: bytes) -> List[Tuple[int, int, bytes]]:
+    records = []
+    offset = 0
+    while offset + Record.size + Checksum.size <= len(data):
+        kind, index, size = Record.unpack_from(data, offset)
+        end = offset + Record.size + size
+        if end + Checksum.size > len(data):
+            break
+        (checksum,) = Checksum.unpack_from(data, end)
+        if checksum != crc32(data[offset:end]):
+            break
+        records.append((kind, index, bytes(data[offset + Record.size:end])))
+        offset = end + Checksum.size
+    return records
+
+try:
+    import fcntl
+
+    def _lock(f: BinaryIO) -> bool:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+except ImportError:
+    import msvcrt
+
+    def _lock(f: BinaryIO) -> bool:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+def claimSession(lockFileName: str) -> Optional[BinaryIO]:
+    # The open, locked lock file, or None while another Autosave holds it.
+    f = open(lockFileName, 'ab')
+    if _lock(f):
+        return f
+    f.close()
+    return None
+
+def releaseSession(lock: BinaryIO) -> None:
+    # Unlinking while still locked keeps another process from claiming a
+    # file that is about to disappear; Windows only allows it once closed.
+    try:
+        remove(lock.name)
+        lock.close()
+    except OSError:
+        lock.close()
+        with suppress(OSError):
+            remove(lock.name)
+
+def printError(error: Exception) -> None:
+    print('Autosave failed: {}: {}'.format(type(error).__name__, error), file=stderr)
+
+def writeAtomic(fileName: str, data: bytes) -> None:
+    temporaryFileName = fileName + '.tmp'
+    try:
+        with open(temporaryFileName, 'wb') as f:
+            f.write(data)
+            f.flush()
+            fsync(f.fileno())
+        replace(temporaryFileName, fileName)
+    except BaseException:
+        if exists(temporaryFileName):
+            remove(temporaryFileName)
+        raise
+
+class Autosave:
+    def __init__(self,
+        directory: str,
+        name: Optional[str] = None,
+        onError: Callable[[Exception], None] = printError,
+    ) -> None:
+        # `onError` is called on the worker thread.
+        makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._name = name if name is not None else 'autosave-{}-{}'.format(getpid(), time_ns())
+        self._onError = onError
+        self._lock = claimSession(self._lockFileName(self._name))
+        if self._lock is None:
+            raise ValueError('Autosave session {} is in use.'.format(self._name))
+        # Recovered sessions, removed once this one has a snapshot.
+        self._adopted: List[Tuple[str, BinaryIO]] = []
+        self._generation = max(self._generations(), default=0)
+        self._pending = 0
+        self._queue: Queue = Queue()
+        self._closed = False
+        self._thread = Thread(target=self._run, name='autosave', daemon=True)
+        self._thread.start()
+
+    def _journals(self) -> List[Tuple[str, int]]:
+        # (session name, generation) of every journal in the directory.
+        journals = []
+        for fileName in listdir(self._directory):
+            if fileName.endswith(JournalExtension):
+                name, _, generation = fileName[:-len(JournalExtension)].rpartition('-')
+                if name and generation.isdigit():
+                    journals.append((name, int(generation)))
+        return journals
+
+    def _generations(self,
+        name: Optional[str] = None,
+    ) -> List[int]:
+        name = name if name is not None else self._name
+        return [generation for session, generation in self._journals() if session == name]
+
+    def _fileName(self,
+        generation: int,
+        extension: str,
+        name: Optional[str] = None,
+    ) -> str:
+        return join(self._directory, '{}-{}{}'.format(name if name is not None else self._name, generation, extension))
+
+    def _lockFileName(self, name: str) -> str:
+        return join(self._directory, name + '.lock')
+
+    def recover(self) -> Optional[Tuple[Font, Text]]:
+        # Rebuilds the newest generation of the most recently written
+        # abandoned session. Other abandoned sessions are left for later
+        # starts.
+        sessions = []
+        for name in sorted({name for name, _ in self._journals()} - {self._name}):
+            lock = claimSession(self._lockFileName(name))
+            if lock is not None:
+                sessions.append((name, lock))
+        sessions.sort(key=lambda session: max(
+            getmtime(self._fileName(generation, JournalExtension, session[0]))
+            for generation in self._generations(session[0])
+        ), reverse=True)
+
+        recovered = None
+        for name, lock in sessions:
+            for generation in sorted(self._generations(name), reverse=True):
+                if recovered is not None:
+                    break
+                try:
+                    recovered = self._rebuild(name, generation)
+                except Exception as error:
+                    self._onError(error)
+                    self._quarantine(name, generation)
+            if recovered is not None and not self._adopted:
+                self._adopted.append((name, lock))
+            else:
+                releaseSession(lock)
+        return recovered
+
+    def _rebuild(self,
+        name: str,
+        generation: int,
+    ) -> Tuple[Font, Text]:
+        # A snapshot plus every intact journal record.
+        font = Font([])
+        with open(self._fileName(generation, FontExtension, name), 'rb') as f:
+            font.fromBytes(f.read())
+        text = Text()
+        with open(self._fileName(generation, TextExtension, name), 'rb') as f:
+            text.fromBytes(f.read())
+        with open(self._fileName(generation, JournalExtension, name), 'rb') as f:
+            records = decodeRecords(f.read())
+
+        for kind, index, payload in records:
+            if kind == SetGlyph:
+                glyph = font.glyphWithOrdinal(index)
+                if glyph is None:
+                    font.addGlyph(Glyph.withWord(index, int.from_bytes(payload, 'big'), font.shape()))
+                else:
+                    glyph.fromUnsignedInt(int.from_bytes(payload, 'big'))
+            elif kind == InsertLine:
+                text.insertLine(index, payload.decode('ascii'))
+            elif kind == SetLine:
+                text.setLine(index, payload.decode('ascii'))
+            elif kind == RemoveLine:
+                text.removeLine(index)
+            elif kind == LineCount:
+                del text.lines()[index:]
+        return font, text
+
+    def glyphChanged(self,
+        glyph: Glyph,
+    ) -> None:
+        self._append(SetGlyph, glyph._ordinal, glyph._word.to_bytes(glyph.shape().wordBytes, 'big'))
+
+    def linePatched(self,
+        index: int,
+        before: Optional[str],
+        after: Optional[str],
+    ) -> None:
+        if after is None:
+            self._append(RemoveLine, index)
+        else:
+            self._append(InsertLine if before is None else SetLine, index, after)
+
+    def _append(self,
+        kind: int,
+        index: int,
+        payload: Union[bytes, str] = b'',
+    ) -> None:
+        # Records are encoded on the worker, so a line that cannot be
+        # encoded is reported through `onError` instead of raising here.
+        self._pending += 1
+        self._queue.put((AppendMessage, (kind, index, payload)))
+
+    def pending(self) -> int:
+        return self._pending
+
+    def snapshot(self,
+        font: Font,
+        text: Text,
+    ) -> None:
+        # Only cheap copies are taken here; decoding lazily loaded glyphs
+        # and lines, encoding and writing the snapshot happens on the
+        # worker thread.
+        self._pending = 0
+        self._queue.put((SnapshotMessage, (font.copy(), text.copy())))
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self,
+        discard: bool = True,
+    ) -> None:
+        # A clean shutdown drops the autosave, so only crashes are recovered.
+        # Sessions recovered but never snapshotted are kept for next time.
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((CloseMessage, discard))
+        self._thread.join()
+        for _, lock in self._adopted:
+            releaseSession(lock)
+        self._adopted = []
+        releaseSession(self._lock)
+
+    def _run(self) -> None:
+        # Edits made before the first snapshot have nothing to apply to, so
+        # the journal only opens with the first compaction. A failing write
+        # or compaction is reported and drops the journal, so the edits up
+        # to the next snapshot are lost but the worker keeps running.
+        journal = None
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                records = []
+                for message, payload in batch:
+                    if message == AppendMessage:
+                        records.append(payload)
+                        continue
+
+                    journal = self._write(journal, records)
+                    records = []
+                    journal = self._closeJournal(journal)
+                    if message == CloseMessage:
+                        if payload:
+                            self._attempt(self._discard)
+                        return
+                    journal = self._attempt(self._compact, *payload)
+                journal = self._write(journal, records)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _attempt(self, function: Callable, *arguments):
+        try:
+            return function(*arguments)
+        except Exception as error:
+            self._onError(error)
+            return None
+
+    def _closeJournal(self, journal) -> None:
+        if journal is not None:
+            with suppress(OSError):
+                journal.close()
+        return None
+
+    def _write(self, journal, records: List[Tuple[int, int, Union[bytes, str]]]):
+        # One flush and fsync for everything queued since the last write. A
+        # batch that fails to encode is dropped as a whole, so the journal
+        # still replays a prefix of the edits.
+        if journal is None or not records:
+            return journal
+        try:
+            journal.write(b''.join(
+                encodeRecord(kind, index, payload.encode('ascii') if isinstance(payload, str) else payload)
+                for kind, index, payload in records
+            ))
+            journal.flush()
+            fsync(journal.fileno())
+        except Exception as error:
+            self._onError(error)
+            return self._closeJournal(journal)
+        return journal
+
+    def _compact(self,
+        font: Font,
+        text: Text,
+    ):
+        shape = font.shape()
+        glyphs = [(glyph._ordinal, glyph._word) for glyph in font.sortedGlyphs()]
+        lines = text.lines()
+        # Only a generation with its journal is ever found again, so the
+        # files of a failed one are removed right away.
+        generation = self._generation + 1
+        try:
+            writeAtomic(self._fileName(generation, FontExtension), encodeFont(glyphs, shape))
+            writeAtomic(self._fileName(generation, TextExtension), encodeLines(lines))
+            writeAtomic(self._fileName(generation, JournalExtension), encodeRecord(LineCount, len(lines)))
+        except BaseException:
+            with suppress(OSError):
+                self._remove(generation)
+            raise
+        self._generation = generation
+
+        for generation in self._generations():
+            if generation < self._generation:
+                self._remove(generation)
+        while self._adopted:
+            name, lock = self._adopted.pop()
+            for generation in self._generations(name):
+                self._remove(generation, name)
+            releaseSession(lock)
+        return open(self._fileName(self._generation, JournalExtension), 'ab')
+
+    def _remove(self,
+        generation: int,
+        name: Optional[str] = None,
+    ) -> None:
+        for extension in (JournalExtension, FontExtension, TextExtension):
+            fileName = self._fileName(generation, extension, name)
+            if exists(fileName):
+                remove(fileName)
+
+    def _quarantine(self,
+        name: str,
+        generation: int,
+    ) -> None:
+        # Kept for inspection, but no longer a journal that is recovered.
+        for extension in (JournalExtension, FontExtension, TextExtension):
+            fileName = self._fileName(generation, extension, name)
+            if exists(fileName):
+                replace(fileName, fileName + '.bad')
+
+    def _discard(self) -> None:
+        for generation in self._generations():
+            self._remove(generation)
+
+if __name__ == '__main__':
+    from tempfile import TemporaryDirectory
+
+    def recoverOnce(directory: str) -> Optional[Tuple[Font, Text]]:
+        # Another editor starting up; it keeps the recovered files.
+        autosave = Autosave(directory)
+        recovered = autosave.recover()
+        autosave.close(discard=False)
+        return recovered
+
+    with TemporaryDirectory() as directory:
+        font = Font()
+        text = Text()
+        text.add("Hello, World!")
+
+        autosave = Autosave(directory)
+        assert autosave.recover() is None
+        autosave.snapshot(font, text)
+        glyph = font.glyphWithOrdinal(ord('a'))
+        glyph.toggle(1, 1, True)
+        autosave.glyphChanged(glyph)
+        autosave.linePatched(1, None, "Foobar.")
+        autosave.linePatched(0, "Hello, World!", "Hello!")
+        autosave.flush()
+
+        # Simulate a crash in the middle of appending a record.
+        with open(autosave._fileName(autosave._generation, JournalExtension), 'ab') as f:
+            f.write(encodeRecord(RemoveLine, 0)[:-1])
+
+        # A running session belongs to its editor.
+        assert recoverOnce(directory) is None
+
+        # The lock goes away with the crashed process.
+        autosave._lock.close()
+        recoveredFont, recoveredText = recoverOnce(directory)
+        assert recoveredFont.glyphWithOrdinal(ord('a')).isOn(1, 1)
+        assert recoveredFont.toBytes() == font.toBytes()
+        assert recoveredText.lines() == ["Hello!", "Foobar."]
+
+        font.setShape(GlyphShape(8, 10))
+        autosave.snapshot(font, text)
+        glyph.toggle(7, 9, True)
+        autosave.glyphChanged(glyph)
+        autosave.flush()
+        recoveredFont, recoveredText = recoverOnce(directory)
+        assert recoveredFont.shape() == GlyphShape(8, 10)
+        assert recoveredFont.toBytes() == font.toBytes()
+
+        # The worker survives a failing compaction.
+        errors = []
+        autosave._onError = errors.append
+        broken = Font([], font.shape())
+        broken.addGlyph(Glyph.withWord(0x100, 0, font.shape()))
+        autosave.snapshot(broken, text)
+        autosave.flush()
+        assert len(errors) == 1 and autosave._thread.is_alive()
+
+        # So does a line that is not ASCII; the journal ends before it.
+        autosave.snapshot(font, text)
+        autosave.linePatched(1, None, "caf\u00e9")
+        autosave.flush()
+        assert len(errors) == 2 and autosave._thread.is_alive()
+
+        # A snapshot failing after its font was written leaves no files.
+        files = sorted(listdir(directory))
+        unencodable = Text()
+        unencodable.add("caf\u00e9")
+        autosave.snapshot(font, unencodable)
+        autosave.flush()
+        assert len(errors) == 3 and sorted(listdir(directory)) == files
+
+        # Recovery adopts the session and removes it with its first snapshot.
+        recovering = Autosave(directory)
+        assert recovering.recover() is not None
+        recovering.snapshot(font, text)
+        recovering.flush()
+        assert recovering._journals() == [(recovering._name, 1)]
+        recovering.close()
+        autosave.close()
+        assert recoverOnce(directory) is None
+
+        # An unreadable generation is set aside instead of failing every start.
+        for extension, data in ((FontExtension, b'\x01'), (TextExtension, b''), (JournalExtension, b'')):
+            with open(join(directory, 'crashed-1' + extension), 'wb') as f:
+                f.write(data)
+        recovering = Autosave(directory, onError=errors.append)
+        assert recovering.recover() is None
+        recovering.close()
+        assert len(errors) == 4 and exists(join(directory, 'crashed-1' + JournalExtension + '.bad'))
+        assert recoverOnce(directory) is None
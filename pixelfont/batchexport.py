@@ -0,0 +1,171 @@
+import json
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os import makedirs
+from os.path import abspath, dirname, join, normcase, splitext
+from time import perf_counter
+from typing import List, Optional, Tuple
+from container import loadFont, loadText
+from export import NumberCharacters, Strategies, subsetFont, writeShader
+
+# Exports many font/text pairs at once, e.g. one per scene of a demo:
+#
+#   python batchexport.py scenes.json --processes 8
+#
+# The manifest is a JSON list of exports with paths relative to it:
+#
+#   [
+#       {"font": "intro.apf", "text": "intro.att", "output": "intro.frag"},
+#       {"font": "end.apfc", "text": "end.apfc", "strategy": "speed",
+#        "mergeText": true, "subset": true}
+#   ]
+#
+# `output` defaults to the font name with a .frag extension, `subset` is
+# true for the number characters or a string of extra characters. The
+# exports run on a process pool; results are reported in manifest order
+# and a failing export does not stop the others. A worker that dies breaks
+# the whole pool, so the unfinished exports are resubmitted to a fresh one;
+# if a pool breaks before finishing anything, the next export runs alone
+# to find the one that kills its worker. Every export goes
+# through `export.writeShader`, so equal inputs give equal bytes and
+# unchanged outputs keep their mtime.
+
+ManifestKeys = ('font', 'text', 'output', 'strategy', 'mergeText', 'subset')
+
+def manifestEntry(
+    entry: dict,
+    directory: str,
+) -> dict:
+    if not isinstance(entry, dict) or 'font' not in entry or 'text' not in entry:
+        raise ValueError('Every export needs a font and a text table: {!r}.'.format(entry))
+    unknown = sorted(set(entry) - set(ManifestKeys))
+    if unknown:
+        raise ValueError('Unknown export keys {}.'.format(', '.join(unknown)))
+    strategy = entry.get('strategy', 'size')
+    if strategy not in Strategies:
+        raise ValueError('Unknown strategy {!r}.'.format(strategy))
+
+    subset = entry.get('subset')
+    font = join(directory, entry['font'])
+    return {
+        'font': font,
+        'text': join(directory, entry['text']),
+        'output': join(directory, entry['output']) if 'output' in entry else splitext(font)[0] + '.frag',
+        'strategy': strategy,
+        'mergeText': bool(entry.get('mergeText', False)),
+        'subset': NumberCharacters if subset is True else subset or None,
+    }
+
+def loadManifest(fileName: str) -> List[dict]:
+    with open(fileName, 'rt') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError('{} does not hold a list of exports.'.format(fileName))
+
+    directory = dirname(abspath(fileName))
+    return [manifestEntry(entry, directory) for entry in entries]
+
+def _result(
+    entry: dict,
+    written: bool = False,
+    seconds: float = 0.,
+    error: Optional[str] = None,
+) -> dict:
+    return {
+        'output': entry['output'],
+        'written': written,
+        'seconds': seconds,
+        'error': error,
+    }
+
+def exportEntry(entry: dict) -> dict:
+    start = perf_counter()
+    try:
+        font = loadFont(entry['font'])
+        text = loadText(entry['text'])
+        if font is None or text is None:
+            raise ValueError('{} has no font or {} no text table.'.format(entry['font'], entry['text']))
+        if entry['subset'] is not None:
+            font = subsetFont(font, text, entry['subset'])
+        makedirs(dirname(abspath(entry['output'])), exist_ok=True)
+        written = writeShader(font, text, entry['output'], entry['mergeText'], Strategies[entry['strategy']])
+    except Exception as error:
+        return _result(entry, seconds=perf_counter() - start, error='{}: {}'.format(type(error).__name__, error))
+    return _result(entry, written, perf_counter() - start)
+
+def claimOutputs(entries: List[dict]) -> Tuple[List[int], List[Tuple[int, dict]]]:
+    # Two exports to the same file would race, so only the first one runs.
+    # Returns the indices of the exports to run and the failed results of
+    # the others.
+    owners = {}
+    rejected = []
+    for index, entry in enumerate(entries):
+        output = normcase(abspath(entry['output']))
+        if output in owners:
+            rejected.append((index, _result(entry, error='Export {} writes the same output.'.format(owners[output]))))
+        else:
+            owners[output] = index
+    return list(owners.values()), rejected
+
+def exportAll(
+    entries: List[dict],
+    processes: Optional[int] = None,
+) -> List[dict]:
+    results: List[Optional[dict]] = [None] * len(entries)
+    indices, rejected = claimOutputs(entries)
+    for index, result in rejected:
+        results[index] = result
+
+    pending = indices
+    isolate = False
+    while pending:
+        batch = pending[:1] if isolate else pending
+        broken = []
+        with ProcessPoolExecutor(1 if isolate else processes) as executor:
+            futures = {index: executor.submit(exportEntry, entries[index]) for index in batch}
+            for index, future in futures.items():
+                try:
+                    results[index] = future.result()
+                except BrokenProcessPool as error:
+                    if isolate:
+                        results[index] = _result(entries[index], error='{}: {}'.format(type(error).__name__, error))
+                    else:
+                        broken.append(index)
+                except Exception as error:
+                    results[index] = _result(entries[index], error='{}: {}'.format(type(error).__name__, error))
+
+        finished = len(batch) - len(broken)
+        pending = broken + pending[len(batch):]
+        isolate = not isolate and bool(broken) and finished == 0
+    return results
+
+def formatResult(result: dict) -> str:
+    state = 'failed' if result['error'] is not None else 'written' if result['written'] else 'unchanged'
+    line = '{:9.3f} s  {:9}  {}'.format(result['seconds'], state, result['output'])
+    if result['error'] is not None:
+        line += '\n             ' + result['error']
+    return line
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(description='Export the ALDI pixel font/text pairs listed in a manifest to GLSL.')
+    parser.add_argument('manifest', help='JSON list of exports.')
+    parser.add_argument('--processes', type=int, help='Worker processes; defaults to the number of CPUs.')
+    parser.add_argument('--report', help='Write the per-export results as JSON.')
+    args = parser.parse_args(arguments)
+
+    start = perf_counter()
+    results = exportAll(loadManifest(args.manifest), args.processes)
+    for result in results:
+        print(formatResult(result))
+
+    failed = sum(result['error'] is not None for result in results)
+    print('{} exports, {} failed, {:.3f} s.'.format(len(results), failed, perf_counter() - start))
+
+    if args.report is not None:
+        with open(args.report, 'wt') as f:
+            json.dump(results, f, indent=1)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,148 @@
+import json
+from argparse import ArgumentParser
+from platform import python_version
+from random import Random
+from sys import exit
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+from glyph import Glyph
+from font import Font
+from text import Text
+from export import generateShader, glyphDataLine, textOffsetLine, textDataLine, packedTextDataLine
+
+# Times the hot paths on synthetic fonts and text tables, writes the results
+# as JSON and compares them against a stored baseline, e.g.
+#
+#   python benchmark.py --output baseline.json
+#   python benchmark.py --baseline baseline.json
+
+FontSizes = [95, 256, 65536]
+TextSizes = [10, 1000, 100000, 1000000]
+QuickFontSizes = [95, 256]
+QuickTextSizes = [10, 1000, 100000]
+
+def syntheticFont(glyphCount: int, random: Random) -> Font:
+    font = Font(range(32, 32 + glyphCount) if glyphCount <= 0xff - 32 else range(glyphCount))
+    for glyph in font.sortedGlyphs():
+        glyph.fromUnsignedInt(random.getrandbits(Glyph.WordBits))
+    return font
+
+def syntheticText(lineCount: int, random: Random) -> Text:
+    text = Text()
+    words = ['pixel', 'font', 'demo', 'shader', 'intro', 'party', '8k', 'ALDI', 'glyph', 'scene']
+    for index in range(lineCount):
+        text.add(' '.join(random.choice(words) for _ in range(random.randrange(1, 6))) + ' {}'.format(index))
+    return text
+
+def measure(
+    function: Callable[[], object],
+    repeat: int,
+) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
+
+def clearExportCaches() -> None:
+    for formatter in (glyphDataLine, textOffsetLine, textDataLine, packedTextDataLine):
+        formatter.cache_clear()
+
+def coldExport(font: Font, text: Text) -> str:
+    clearExportCaches()
+    return generateShader(font, text, 'benchmark')
+
+def run(
+    fontSizes: List[int],
+    textSizes: List[int],
+    repeat: int,
+) -> Dict[str, float]:
+    random = Random(1337)
+    results = {}
+
+    smallText = syntheticText(10, random)
+    for glyphCount in fontSizes:
+        font = syntheticFont(glyphCount, random)
+        glyphs = font.sortedGlyphs()
+
+        results['glyph.toUnsignedInt/{}'.format(glyphCount)] = measure(lambda: [glyph.toUnsignedInt() for glyph in glyphs], repeat)
+        results['font.chunks/{}'.format(glyphCount)] = measure(lambda: font.chunks(4), repeat)
+        results['font.glyphWithOrdinal/{}'.format(glyphCount)] = measure(lambda: [font.glyphWithOrdinal(ordinal) for ordinal in font._ordinals], repeat)
+
+        # The .apf format stores one byte per ordinal.
+        if font.ordinalAt(font.glyphCount() - 1) <= 0xff:
+            data = font.toBytes()
+            results['font.toBytes/{}'.format(glyphCount)] = measure(font.toBytes, repeat)
+            results['font.fromBytes/{}'.format(glyphCount)] = measure(lambda: Font([]).fromBytes(data), repeat)
+
+        results['export/font{}-text10'.format(glyphCount)] = measure(lambda: coldExport(font, smallText), repeat)
+
+    smallFont = syntheticFont(95, random)
+    for lineCount in textSizes:
+        text = syntheticText(lineCount, random)
+        data = text.toBytes()
+
+        results['text.toUnsignedIntegerArray/{}'.format(lineCount)] = measure(text.toUnsignedIntegerArray, repeat)
+        results['text.offsets/{}'.format(lineCount)] = measure(text.offsets, repeat)
+        results['text.toBytes/{}'.format(lineCount)] = measure(text.toBytes, repeat)
+        results['text.fromBytes/{}'.format(lineCount)] = measure(lambda: Text().fromBytes(data), repeat)
+        results['text.pack-merged/{}'.format(lineCount)] = measure(lambda: text.pack(merge=True), repeat)
+        results['export/font95-text{}'.format(lineCount)] = measure(lambda: coldExport(smallFont, text), repeat)
+
+    return results
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    tolerance: float,
+) -> List[str]:
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is not None and seconds > reference * tolerance:
+            regressions.append('{}: {:.6f} s, baseline {:.6f} s (x{:.2f})'.format(
+                name,
+                seconds,
+                reference,
+                seconds / reference,
+            ))
+    return regressions
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(description='Benchmark the ALDI pixel font hot paths on synthetic data.')
+    parser.add_argument('--quick', action='store_true', help='Skip the 65536 glyph font and the 1,000,000 line text table.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best one is reported.')
+    parser.add_argument('--output', help='Write the results as JSON to this file.')
+    parser.add_argument('--baseline', help='JSON results to compare against.')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='Slowdown factor against the baseline that counts as a regression.')
+    args = parser.parse_args(arguments)
+
+    results = run(
+        QuickFontSizes if args.quick else FontSizes,
+        QuickTextSizes if args.quick else TextSizes,
+        args.repeat,
+    )
+
+    for name, seconds in sorted(results.items()):
+        print('{:40} {:12.6f} s'.format(name, seconds))
+
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump({
+                'python': python_version(),
+                'results': results,
+            }, f, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'rt') as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
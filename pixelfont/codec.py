@@ -0,0 +1,227 @@
+import struct
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Union
+from glyph import Glyph, GlyphShape
+
+# Bulk readers and writers for the .apf and .att layouts. They produce the
+# same bytes as `Font.BinarySaveFormat` and `Text.BinarySaveFormat`, but
+# work on whole buffers with struct instead of building one construct
+# container per record.
+#
+# Fonts with glyphs other than 5x6 start with a header
+#
+#   '>4sBBB'  magic, version, glyph width, glyph height
+#
+# followed by records of one ordinal byte and the packed pixels in whole
+# bytes. The version byte is odd, which a 5x6 record can never be at that
+# position as its last word byte carries the zero padding bits, so files
+# without a header keep their original meaning.
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+FontHeader = struct.Struct('>4sBBB')
+FontMagic = b'\xffAPF'
+FontVersion = 1
+TextAlignment = 4
+TextWord = struct.Struct('=I')
+
+class CodecError(ValueError):
+    pass
+
+@lru_cache(maxsize=None)
+def glyphRecord(shape: GlyphShape) -> struct.Struct:
+    return struct.Struct('>B{}s'.format(shape.wordBytes))
+
+def decodeGlyphs(
+    data: Buffer,
+    shape: GlyphShape = Glyph.DefaultShape,
+) -> List[Tuple[int, int]]:
+    record = glyphRecord(shape)
+    if len(data) % record.size != 0:
+        raise CodecError('Truncated font data: {} bytes is not a multiple of the {} byte glyph record.'.format(
+            len(data),
+            record.size,
+        ))
+
+    return [
+        (ordinal, int.from_bytes(word, 'big') & shape.wordMask)
+        for ordinal, word in record.iter_unpack(data)
+    ]
+
+def encodeGlyphs(
+    records: Iterable[Tuple[int, int]],
+    shape: GlyphShape = Glyph.DefaultShape,
+) -> bytes:
+    record = glyphRecord(shape)
+    records = list(records)
+    result = bytearray(record.size * len(records))
+    for index, (ordinal, word) in enumerate(records):
+        record.pack_into(result, index * record.size, ordinal, word.to_bytes(shape.wordBytes, 'big'))
+    return bytes(result)
+
+def decodeFont(data: Buffer) -> Tuple[GlyphShape, List[Tuple[int, int]]]:
+    if len(data) >= FontHeader.size and bytes(data[:len(FontMagic)]) == FontMagic and data[len(FontMagic)] & 1:
+        magic, version, width, height = FontHeader.unpack_from(data)
+        if version != FontVersion:
+            raise CodecError('Unsupported font version {}, only {} is supported.'.format(version, FontVersion))
+        shape = GlyphShape(width, height)
+        return shape, decodeGlyphs(memoryview(data)[FontHeader.size:], shape)
+
+    return Glyph.DefaultShape, decodeGlyphs(data)
+
+def encodeFont(
+    records: Iterable[Tuple[int, int]],
+    shape: GlyphShape = Glyph.DefaultShape,
+) -> bytes:
+    if shape == Glyph.DefaultShape:
+        return encodeGlyphs(records)
+    return FontHeader.pack(FontMagic, FontVersion, shape.width, shape.height) + encodeGlyphs(records, shape)
+
+def decodeLines(data: Buffer) -> List[str]:
+    data = bytes(data)
+    size = len(data)
+    lines = []
+    offset = 0
+    while offset < size:
+        end = offset + 1 + data[offset]
+        if end > size:
+            raise CodecError('Truncated text data: line at byte {} needs {} bytes, only {} left.'.format(
+                offset,
+                end - offset,
+                size - offset,
+            ))
+        try:
+            lines.append(data[offset + 1:end].decode('ascii'))
+        except UnicodeDecodeError as error:
+            raise CodecError('Line at byte {} is not ASCII.'.format(offset)) from error
+        offset = end
+    return lines
+
+def encodeLine(line: str) -> bytes:
+    try:
+        encoded = line.encode('ascii')
+    except UnicodeEncodeError as error:
+        raise CodecError('Line {!r} is not ASCII.'.format(line)) from error
+    if len(encoded) > 0xff:
+        raise CodecError('Line {!r} is longer than 255 bytes.'.format(line))
+    return encoded
+
+def encodeLines(lines: Iterable[str]) -> bytes:
+    result = bytearray()
+    for line in lines:
+        encoded = encodeLine(line)
+        result.append(len(encoded))
+        result += encoded
+    result += bytes(-len(result) % TextAlignment)
+    return bytes(result)
+
+def bytesToWords(data: Buffer) -> List[int]:
+    return list(struct.unpack('={}I'.format(len(data) // TextWord.size), data))
+
+def linesToWords(lines: Iterable[str]) -> List[int]:
+    return bytesToWords(encodeLines(lines))
+
+def mergeLines(lines: Iterable[str]) -> Tuple[List[int], bytes]:
+    # Pool layout for the exported text table: identical lines share one
+    # record, and a record that is a suffix of another one (length byte
+    # included) points into the tail of the longer record. Sorting the
+    # reversed records puts every such suffix right before a record that
+    # ends with it, so one sort finds all of them.
+    lines = list(lines)
+    records = {}
+    for line in lines:
+        if line not in records:
+            encoded = encodeLine(line)
+            records[line] = bytes((len(encoded),)) + encoded
+
+    reversedRecords = sorted(map(lambda record: record[::-1], set(records.values())))
+    container = {}
+    for index in range(len(reversedRecords) - 1, -1, -1):
+        current = reversedRecords[index]
+        following = reversedRecords[index + 1] if index + 1 < len(reversedRecords) else None
+        if following is not None and following.startswith(current):
+            container[current] = container[following]
+        else:
+            container[current] = current
+
+    result = bytearray()
+    rootOffsets = {}
+    for reversedRecord in reversedRecords:
+        if container[reversedRecord] == reversedRecord:
+            rootOffsets[reversedRecord] = len(result)
+            result += reversedRecord[::-1]
+
+    recordOffsets = {}
+    for line, record in records.items():
+        reversedRecord = record[::-1]
+        root = container[reversedRecord]
+        recordOffsets[line] = rootOffsets[root] + len(root) - len(record)
+
+    result += bytes(-len(result) % TextAlignment)
+    return [recordOffsets[line] for line in lines], bytes(result)
+
+if __name__ == '__main__':
+    from font import Font
+    from text import Text
+    from random import Random
+    from timeit import timeit
+
+    random = Random(1337)
+
+    font = Font(range(256))
+    for glyph in font._glyphs.values():
+        glyph.fromUnsignedInt(random.getrandbits(Glyph.WordBits))
+    fontData = Font.BinarySaveFormat.build([glyph.toObject() for glyph in font._glyphs.values()])
+    assert encodeGlyphs(decodeGlyphs(fontData)) == fontData
+    assert [(glyph['ordinal'], Glyph.packPixels(glyph['pixels'])) for glyph in Font.BinarySaveFormat.parse(fontData)] == decodeGlyphs(fontData)
+    assert encodeFont(decodeGlyphs(fontData)) == fontData
+    assert decodeFont(fontData) == (Glyph.DefaultShape, decodeGlyphs(fontData))
+
+    shape = GlyphShape(12, 16)
+    records = [(ordinal, random.getrandbits(shape.pixelCount) << (shape.wordBits - shape.pixelCount)) for ordinal in range(256)]
+    assert decodeFont(encodeFont(records, shape)) == (shape, records)
+
+    lines = [''.join(chr(random.randrange(32, 127)) for _ in range(random.randrange(40))) for _ in range(10000)]
+    textData = Text.BinarySaveFormat.build(lines)
+    assert encodeLines(lines) == textData
+    assert decodeLines(textData) == list(Text.BinarySaveFormat.parse(textData))
+    assert linesToWords(lines) == list(Text.BinaryExportFormat.parse(textData))
+
+    try:
+        decodeGlyphs(fontData[:-1])
+        assert False
+    except CodecError:
+        pass
+    try:
+        decodeLines(b'\x05abc')
+        assert False
+    except CodecError:
+        pass
+
+    suffix = 'x' * ord('!')
+    mergeInput = ['Hello, World!', 'Hello, World!', '', 'Hi!' + suffix, suffix, 'Foobar.']
+    mergeOffsets, mergeData = mergeLines(mergeInput)
+    assert len(mergeData) == len(encodeLines(['Hello, World!', '', 'Hi!' + suffix, 'Foobar.']))
+    assert mergeOffsets[4] == mergeOffsets[3] + 3
+    for line, offset in zip(mergeInput, mergeOffsets):
+        assert decodeLines(mergeData[offset:offset + 1 + mergeData[offset]]) == [line]
+    mergeOffsets, mergeData = mergeLines(lines)
+    for line, offset in zip(lines, mergeOffsets):
+        assert mergeData[offset + 1:offset + 1 + mergeData[offset]].decode('ascii') == line
+
+    def report(name: str, size: int, reference, fast) -> None:
+        referenceTime = timeit(reference, number=3) / 3
+        fastTime = timeit(fast, number=3) / 3
+        print('{:14} construct {:9.2f} MB/s   codec {:9.2f} MB/s   x{:.1f}'.format(
+            name,
+            size / referenceTime / 1e6,
+            size / fastTime / 1e6,
+            referenceTime / fastTime,
+        ))
+
+    fontObjects = Font.BinarySaveFormat.parse(fontData)
+    records = decodeGlyphs(fontData)
+    report('font decode', len(fontData), lambda: Font.BinarySaveFormat.parse(fontData), lambda: decodeGlyphs(fontData))
+    report('font encode', len(fontData), lambda: Font.BinarySaveFormat.build(fontObjects), lambda: encodeGlyphs(records))
+    report('text decode', len(textData), lambda: Text.BinarySaveFormat.parse(textData), lambda: decodeLines(textData))
+    report('text encode', len(textData), lambda: Text.BinarySaveFormat.build(lines), lambda: encodeLines(lines))
@@ -0,0 +1,501 @@
+import struct
+from mmap import mmap, ACCESS_READ
+from os import fstat, remove, replace
+from os.path import abspath, exists, getsize, normcase, splitext
+from threading import Lock
+from weakref import WeakSet
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from glyph import Glyph, GlyphShape
+from font import Font
+from text import Text
+from codec import CodecError
+
+# Versioned container holding any number of named fonts and text tables.
+#
+#   header   '<4sHH'          magic, version, entry count
+#   entries  '<BBBxIQQ32s'    kind, glyph width, glyph height, record count,
+#                             index offset, data offset, name
+#
+# A font index is the sorted uint32 ordinals, its data one big-endian glyph
+# word of whole bytes per ordinal. Glyph dimensions of 0 (text entries and
+# containers written before they were stored) mean the default 5x6. A text index is `count + 1` uint32 byte offsets into the
+# concatenated ASCII lines. Everything can be read in place from an mmap;
+# fonts and texts taken from a `Container` decode lazily and must be used
+# before it is closed. `loadFont`/`loadText` decode everything and close
+# the map unless asked to load lazily, as the editor does; such a font or
+# text keeps the file mapped until it is released or the file is saved
+# over, which detaches it into memory. Saving into an existing container
+# keeps its other entries.
+#
+# Loading and saving take an optional `progress(done, total)` hook, called
+# between chunks; it may raise to abort, e.g. `jobs.Cancelled`. Files are
+# written under a temporary name and renamed into place, so an aborted or
+# failed save leaves the previous file intact.
+
+ChunkSize = 1 << 20
+
+Progress = Callable[[int, int], None]
+
+Magic = b'APFC'
+Version = 1
+Extension = '.apfc'
+
+Header = struct.Struct('<4sHH')
+Entry = struct.Struct('<BBBxIQQ32s')
+
+FontKind = 0
+TextKind = 1
+
+class MappedFontSource:
+    def __init__(self,
+        container: 'Container',
+        count: int,
+        indexOffset: int,
+        dataOffset: int,
+        shape: GlyphShape = Glyph.DefaultShape,
+    ) -> None:
+        self._container = container
+        self._count = count
+        self._indexOffset = indexOffset
+        self._dataOffset = dataOffset
+        self._shape = shape
+
+    def shape(self) -> GlyphShape:
+        return self._shape
+
+    def ordinals(self) -> Tuple[int]:
+        with self._container._lock:
+            return struct.unpack_from('<{}I'.format(self._count), self._container.data(), self._indexOffset)
+
+    def wordData(self) -> bytes:
+        with self._container._lock:
+            return self._container.data()[self._dataOffset:self._dataOffset + self._count * self._shape.wordBytes]
+
+    def glyph(self, index: int) -> Glyph:
+        offset = self._dataOffset + index * self._shape.wordBytes
+        with self._container._lock:
+            data = self._container.data()
+            return Glyph.withWord(
+                struct.unpack_from('<I', data, self._indexOffset + 4 * index)[0],
+                int.from_bytes(data[offset:offset + self._shape.wordBytes], 'big'),
+                self._shape,
+            )
+
+class MappedTextSource:
+    def __init__(self,
+        container: 'Container',
+        count: int,
+        indexOffset: int,
+        dataOffset: int,
+    ) -> None:
+        self._container = container
+        self._count = count
+        self._indexOffset = indexOffset
+        self._dataOffset = dataOffset
+
+    def lineCount(self) -> int:
+        return self._count
+
+    def line(self, index: int) -> str:
+        with self._container._lock:
+            data = self._container.data()
+            start, end = struct.unpack_from('<II', data, self._indexOffset + 4 * index)
+            if not start <= end <= len(data) - self._dataOffset:
+                raise CodecError('Line {} lies outside of the container.'.format(index))
+            return data[self._dataOffset + start:self._dataOffset + end].decode('ascii')
+
+    def lines(self) -> List[str]:
+        # All lines at once, from one copy of the text data.
+        with self._container._lock:
+            data = self._container.data()
+            offsets = struct.unpack_from('<{}I'.format(self._count + 1), data, self._indexOffset)
+            if any(start > end for start, end in zip(offsets, offsets[1:])):
+                raise CodecError('Unordered line offsets in the container.')
+            data = data[self._dataOffset:self._dataOffset + offsets[-1]].decode('ascii')
+        return [data[start:end] for start, end in zip(offsets, offsets[1:])]
+
+# Containers that may still map their file, to unmap them before the
+# file is replaced.
+_containers: 'WeakSet[Container]' = WeakSet()
+
+class Container:
+    def __init__(self, fileName: str) -> None:
+        self._data = None
+        self._path = normcase(abspath(fileName))
+        self._lock = Lock()
+        with open(fileName, 'rb') as f:
+            # mmap refuses empty files.
+            if fstat(f.fileno()).st_size < Header.size:
+                raise CodecError('Truncated container header in {}.'.format(fileName))
+            self._data = mmap(f.fileno(), 0, access=ACCESS_READ)
+
+        try:
+            self._readEntries(fileName)
+        except BaseException:
+            self.close()
+            raise
+        _containers.add(self)
+
+    def _readEntries(self, fileName: str) -> None:
+
+        magic, version, entryCount = Header.unpack_from(self._data, 0)
+        if magic != Magic:
+            raise CodecError('{} is not an ALDI pixel font container.'.format(fileName))
+        if version > Version:
+            raise CodecError('{} has container version {}, only {} is supported.'.format(fileName, version, Version))
+        if len(self._data) < Header.size + entryCount * Entry.size:
+            raise CodecError('Truncated container entry table in {}.'.format(fileName))
+
+        self._entries = []
+        for index in range(entryCount):
+            kind, width, height, count, indexOffset, dataOffset, name = Entry.unpack_from(self._data, Header.size + index * Entry.size)
+            indexSize = 4 * (count if kind == FontKind else count + 1)
+            if indexOffset + indexSize > len(self._data) or dataOffset > len(self._data):
+                raise CodecError('Truncated container entry {} in {}.'.format(index, fileName))
+            shape = GlyphShape(width, height) if width and height else Glyph.DefaultShape
+            if kind == FontKind:
+                dataSize = count * shape.wordBytes
+            else:
+                # The last line offset is the size of the text data.
+                (dataSize,) = struct.unpack_from('<I', self._data, indexOffset + 4 * count)
+            if dataOffset + dataSize > len(self._data):
+                raise CodecError('Truncated container entry {} in {}.'.format(index, fileName))
+            self._entries.append((kind, name.rstrip(b'\0').decode('ascii'), count, indexOffset, dataOffset, shape))
+
+    def data(self) -> Union[mmap, bytes]:
+        if self._data is None:
+            raise ValueError('The container is closed.')
+        return self._data
+
+    def close(self) -> None:
+        # Fonts and texts taken from the container must not be used anymore.
+        with self._lock:
+            if isinstance(self._data, mmap):
+                self._data.close()
+            self._data = None
+
+    def detach(self) -> None:
+        # Unmaps the file but keeps its data in memory, so that fonts and
+        # texts taken from the container, and their copies, stay usable
+        # while the file is replaced.
+        with self._lock:
+            if isinstance(self._data, mmap):
+                data = self._data[:]
+                self._data.close()
+                self._data = data
+
+    def isMapped(self) -> bool:
+        return isinstance(self._data, mmap)
+
+    def __enter__(self) -> 'Container':
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    def fontNames(self) -> List[str]:
+        return [name for kind, name, *_ in self._entries if kind == FontKind]
+
+    def textNames(self) -> List[str]:
+        return [name for kind, name, *_ in self._entries if kind == TextKind]
+
+    def _entry(self, kind: int, name: Optional[str]) -> Optional[tuple]:
+        for entry in self._entries:
+            if entry[0] == kind and (name is None or entry[1] == name):
+                return entry
+        return None
+
+    def font(self, name: Optional[str] = None) -> Optional[Font]:
+        entry = self._entry(FontKind, name)
+        if entry is None:
+            return None
+        font = Font([])
+        font._setSource(MappedFontSource(self, *entry[2:]))
+        return font
+
+    def text(self, name: Optional[str] = None) -> Optional[Text]:
+        entry = self._entry(TextKind, name)
+        if entry is None:
+            return None
+        text = Text()
+        text._setSource(MappedTextSource(self, *entry[2:5]))
+        return text
+
+def releaseFile(fileName: str) -> None:
+    # Detaches every container that still maps `fileName`; Windows cannot
+    # replace a mapped file.
+    path = normcase(abspath(fileName))
+    for container in list(_containers):
+        if container._path == path:
+            container.detach()
+
+def release(document: Union[Font, Text]) -> None:
+    # Detaches the container a lazily loaded font or text reads from, e.g.
+    # once it is no longer the open document.
+    if isinstance(document._source, (MappedFontSource, MappedTextSource)):
+        document._source._container.detach()
+
+def writeContainer(
+    fileName: str,
+    fonts: Dict[str, Font] = {},
+    texts: Dict[str, Text] = {},
+) -> None:
+    entries = []
+    blobs = []
+    offset = Header.size + (len(fonts) + len(texts)) * Entry.size
+
+    for name, font in fonts.items():
+        glyphs = font.sortedGlyphs()
+        index = struct.pack('<{}I'.format(len(glyphs)), *map(lambda glyph: glyph._ordinal, glyphs))
+        shape = font.shape()
+        data = b''.join(map(lambda glyph: glyph._word.to_bytes(shape.wordBytes, 'big'), glyphs))
+        entries.append((FontKind, shape.width, shape.height, len(glyphs), offset, offset + len(index), name.encode('ascii')))
+        blobs += [index, data]
+        offset += len(index) + len(data)
+
+    for name, text in texts.items():
+        encoded = [line.encode('ascii') for line in text.lines()]
+        lineOffsets = [0]
+        for line in encoded:
+            lineOffsets.append(lineOffsets[-1] + len(line))
+        index = struct.pack('<{}I'.format(len(lineOffsets)), *lineOffsets)
+        data = b''.join(encoded)
+        entries.append((TextKind, 0, 0, len(encoded), offset, offset + len(index), name.encode('ascii')))
+        blobs += [index, data]
+        offset += len(index) + len(data)
+
+    with open(fileName, 'wb') as f:
+        f.write(Header.pack(Magic, Version, len(entries)))
+        for entry in entries:
+            f.write(Entry.pack(*entry))
+        for blob in blobs:
+            f.write(blob)
+
+def reportProgress(
+    progress: Optional[Progress],
+    done: int,
+    total: int,
+) -> None:
+    if progress is not None:
+        progress(done, total)
+
+def readFile(
+    fileName: str,
+    progress: Optional[Progress] = None,
+    binary: bool = True,
+) -> Union[bytes, str]:
+    total = getsize(fileName)
+    chunks = []
+    done = 0
+    with open(fileName, 'rb' if binary else 'rt') as f:
+        while True:
+            reportProgress(progress, done, total)
+            chunk = f.read(ChunkSize)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            done += len(chunk)
+    return (b'' if binary else '').join(chunks)
+
+def writeFile(
+    fileName: str,
+    data: Union[bytes, str],
+    progress: Optional[Progress] = None,
+) -> None:
+    temporaryFileName = fileName + '.tmp'
+    try:
+        with open(temporaryFileName, 'wb' if isinstance(data, bytes) else 'wt') as f:
+            for offset in range(0, len(data), ChunkSize):
+                reportProgress(progress, offset, len(data))
+                f.write(data[offset:offset + ChunkSize])
+        reportProgress(progress, len(data), len(data))
+        replace(temporaryFileName, fileName)
+    except BaseException:
+        if exists(temporaryFileName):
+            remove(temporaryFileName)
+        raise
+
+def isContainer(fileName: str) -> bool:
+    return splitext(fileName)[1].lower() == Extension
+
+def updateContainer(
+    fileName: str,
+    fonts: Dict[str, Font] = {},
+    texts: Dict[str, Text] = {},
+    progress: Optional[Progress] = None,
+) -> None:
+    # Replaces the given entries and keeps all others of an existing
+    # container in their order. The result is written under a temporary
+    # name and renamed into place once the old file is closed.
+    if exists(fileName):
+        with Container(fileName) as container:
+            fonts = {
+                **{name: fonts.get(name) or _decodedFont(container.font(name)) for name in container.fontNames()},
+                **fonts,
+            }
+            texts = {
+                **{name: texts.get(name) or _decodedText(container.text(name)) for name in container.textNames()},
+                **texts,
+            }
+
+    temporaryFileName = fileName + '.tmp'
+    try:
+        reportProgress(progress, 0, 1)
+        writeContainer(temporaryFileName, fonts, texts)
+        reportProgress(progress, 1, 1)
+        releaseFile(fileName)
+        replace(temporaryFileName, fileName)
+    except BaseException:
+        if exists(temporaryFileName):
+            remove(temporaryFileName)
+        raise
+
+def _decodedFont(font: Optional[Font]) -> Optional[Font]:
+    # Decodes every glyph, so the font outlives the container's map.
+    if font is not None:
+        font.sortedGlyphs()
+    return font
+
+def _decodedText(text: Optional[Text]) -> Optional[Text]:
+    if text is not None:
+        text.lines()
+    return text
+
+def loadFont(
+    fileName: str,
+    progress: Optional[Progress] = None,
+    lazy: bool = False,
+) -> Optional[Font]:
+    # None only for a container without a font. A lazily loaded font keeps
+    # the container mapped and decodes glyphs on first access, until it is
+    # released or the file is saved over.
+    if isContainer(fileName):
+        reportProgress(progress, 0, 1)
+        container = Container(fileName)
+        try:
+            font = container.font()
+            if not lazy or font is None:
+                _decodedFont(font)
+                container.close()
+        except BaseException:
+            container.close()
+            raise
+        reportProgress(progress, 1, 1)
+        return font
+
+    font = Font([])
+    font.fromBytes(readFile(fileName, progress))
+    return font
+
+def saveFont(
+    fileName: str,
+    font: Font,
+    text: Optional[Text] = None,
+    progress: Optional[Progress] = None,
+) -> None:
+    if isContainer(fileName):
+        updateContainer(fileName, {'font': font}, {'text': text} if text is not None else {}, progress)
+        return
+
+    writeFile(fileName, font.toBytes(), progress)
+
+def loadText(
+    fileName: str,
+    progress: Optional[Progress] = None,
+    lazy: bool = False,
+) -> Optional[Text]:
+    if isContainer(fileName):
+        reportProgress(progress, 0, 1)
+        container = Container(fileName)
+        try:
+            text = container.text()
+            if not lazy or text is None:
+                _decodedText(text)
+                container.close()
+        except BaseException:
+            container.close()
+            raise
+        reportProgress(progress, 1, 1)
+        return text
+
+    text = Text()
+    text.fromBytes(readFile(fileName, progress))
+    return text
+
+def saveText(
+    fileName: str,
+    text: Text,
+    progress: Optional[Progress] = None,
+) -> None:
+    if isContainer(fileName):
+        updateContainer(fileName, texts={'text': text}, progress=progress)
+        return
+
+    writeFile(fileName, text.toBytes(), progress)
+
+if __name__ == '__main__':
+    from tempfile import TemporaryDirectory
+    from os.path import join
+
+    font = Font()
+    font.glyphWithOrdinal(ord('a')).toggle(1, 1, True)
+    text = Text()
+    text.add("Hello, World!")
+    text.add("Foobar.")
+
+    with TemporaryDirectory() as directory:
+        fileName = join(directory, 'test' + Extension)
+        saveFont(fileName, font, text)
+
+        container = Container(fileName)
+        assert container.fontNames() == ['font'] and container.textNames() == ['text']
+
+        loaded = container.font()
+        assert loaded.glyphCount() == font.glyphCount()
+        assert all(map(lambda entry: isinstance(entry, int), loaded._glyphs.values()))
+        assert loaded.glyphWithOrdinal(ord('a')).isOn(1, 1)
+        assert sum(map(lambda entry: isinstance(entry, Glyph), loaded._glyphs.values())) == 1
+        assert loaded.wordData() == font.wordData()
+        assert sum(map(lambda entry: isinstance(entry, Glyph), loaded._glyphs.values())) == 1
+        assert loaded.toBytes() == font.toBytes()
+
+        loadedText = container.text()
+        assert loadedText.lineCount() == 2
+        assert loadedText.line(1) == "Foobar."
+        assert isinstance(loadedText._lines[0], int)
+        assert loadedText.toBytes() == text.toBytes()
+
+        legacyFileName = join(directory, 'test.apf')
+        saveFont(legacyFileName, loaded)
+        assert loadFont(legacyFileName).toBytes() == font.toBytes()
+        container.close()
+
+        # Saving one kind of entry keeps the others.
+        other = Text()
+        other.add("Other.")
+        saveText(fileName, other)
+        assert loadFont(fileName).toBytes() == font.toBytes()
+        assert loadText(fileName).lines() == ["Other."]
+        saveFont(fileName, font)
+        assert loadText(fileName).lines() == ["Other."]
+
+        font.setShape(GlyphShape(9, 12))
+        saveFont(fileName, font, text)
+        with Container(fileName) as container:
+            loaded = container.font()
+            assert loaded.shape() == font.shape()
+            assert loaded.glyphWithOrdinal(ord('a')).isOn(1, 1)
+            assert loaded.toBytes() == font.toBytes()
+
+        with open(fileName, 'rb') as f:
+            data = f.read()
+        brokenFileName = join(directory, 'broken' + Extension)
+        for broken in (b'', data[:-1], data[:-len(text.toBytes())]):
+            with open(brokenFileName, 'wb') as f:
+                f.write(broken)
+            try:
+                loadText(brokenFileName)
+            except CodecError:
+                pass
+            else:
+                assert False, len(broken)
@@ -0,0 +1,781 @@
+import instrument
+import json
+import struct
+from argparse import ArgumentParser
+from functools import lru_cache
+from hashlib import sha256
+from os import makedirs, stat
+from os.path import abspath, basename, exists, join, splitext
+from typing import Dict, List, Optional, Tuple
+from glyph import Glyph, GlyphShape
+from font import Font
+from text import Text
+from codec import TextWord, encodeFont
+from container import Progress, loadFont, loadText, readFile, reportProgress, writeFile
+
+# Qt-free GLSL export. The font editor and the command line both go
+# through `writeShader`, e.g.
+#
+#   python export.py font.apf text.att -o font.frag
+
+HeaderTemplate = '''// Generated by the ALDI Pixel Font Editor (c) 2022 Alexander Kraus <nr4@z10.info>.
+// Find a convenient font and text database editor at: https://github.com/LeStahL/aldi-pixel-font.
+'''
+
+FontDataTemplate = '''{constant}uint {uniqueFontId}[{glyphDataSize}] = uint[{glyphDataSize}](
+    {dataLines}
+);
+
+'''
+
+TextOffsetTemplate = '''{constant}uint {uniqueFontId}_text_offsets[{textCount}] = uint[{textCount}](
+    {textOffsetLines}
+);
+
+'''
+
+TextLengthTemplate = '''{constant}uint {uniqueFontId}_text_lengths[{textCount}] = uint[{textCount}](
+    {textLengthLines}
+);
+
+'''
+
+TextStringTemplate = '''{constant}uint {uniqueFontId}_text_strings[{textDataSize}] = uint[{textDataSize}](
+    {textDataLines}
+);
+
+'''
+
+PackedTextStringTemplate = '''{constant}uvec4 {uniqueFontId}_text_strings[{textDataSize}] = uvec4[{textDataSize}](
+    {textDataLines}
+);
+
+'''
+
+GlyphTemplate = '''float d{uniqueFontId}(vec2 uv, uint ordinal, float pixelSize) {{
+    vec2 xij = (uv - mod(uv, pixelSize) + .5*pixelSize)/pixelSize;
+    return !(any(lessThan(xij, vec2(0))) || any(greaterThanEqual(xij, vec2({width},{height})))) && bool(({uniqueFontId}[{glyphSlot}] >> ({width}u * (uint(xij.y) + 1u) + {glyphShift}u - uint(xij.x))) & 1u) ? -1. : 1.;
+}}
+
+'''
+
+BranchlessGlyphTemplate = '''float d{uniqueFontId}(vec2 uv, uint ordinal, float pixelSize) {{
+    vec2 xij = (uv - mod(uv, pixelSize) + .5*pixelSize)/pixelSize;
+    bool inside = all(greaterThanEqual(xij, vec2(0))) && all(lessThan(xij, vec2({width},{height})));
+    uvec2 ij = uvec2(max(xij, vec2(0)));
+    uint bit = ({uniqueFontId}[inside ? {glyphSlot} : 0u] >> ({width}u * ij.y + {glyphRowShift}u - ij.x)) & uint(inside);
+    return 1. - 2. * float(bit);
+}}
+
+'''
+
+# Fonts whose ordinals are not one gap-free run of distinct glyphs can
+# store every distinct glyph once and map ordinals to these slots, either
+# by a packed index of `slotBits` per ordinal or by a table of ranges
+#
+#   bits 0-7    first ordinal
+#   bits 8-15   ordinal count - 1
+#   bits 16-30  first slot
+#   bit 31      set if the slots count up with the ordinals, clear if all
+#               ordinals of the range share the first slot
+#
+# `shaderTables` measures the generated source for each and keeps the
+# smallest. Ordinals missing from the font show as an empty glyph.
+IndexSlotTemplate = '''{constant}uint {uniqueFontId}_slots[{slotDataSize}] = uint[{slotDataSize}](
+    {slotDataLines}
+);
+
+uint {uniqueFontId}_slot(uint ordinal) {{
+    uint i = ordinal - {firstOrdinal}u;
+    return ({uniqueFontId}_slots[i >> {slotWordShift}u] >> ((i & {slotIndexMask}u) * {slotBits}u)) & {slotMask}u;
+}}
+
+'''
+
+RangeSlotTemplate = '''{constant}uint {uniqueFontId}_ranges[{slotDataSize}] = uint[{slotDataSize}](
+    {slotDataLines}
+);
+
+uint {uniqueFontId}_slot(uint ordinal) {{
+    for(int i = 0; i < {slotDataSize}; ++i) {{
+        uint range = {uniqueFontId}_ranges[i],
+            offset = ordinal - (range & 0xffu);
+        if(offset <= ((range >> 8u) & 0xffu)) return ((range >> 16u) & 0x7fffu) + offset * (range >> 31u);
+    }}
+    return 0u;
+}}
+
+'''
+
+SlotTemplates = {
+    'direct': '',
+    'index': IndexSlotTemplate,
+    'ranges': RangeSlotTemplate,
+}
+
+# Glyphs of up to 31 pixels are one uint each, MSB-aligned like the 5x6
+# words. Larger glyphs are concatenated into one bitstream without
+# any per-glyph padding; pixel (x, y) of glyph i is bit
+# `i * pixelCount + y * width + x`, MSB-first in every uint.
+StreamGlyphTemplate = '''float d{uniqueFontId}(vec2 uv, uint ordinal, float pixelSize) {{
+    vec2 xij = (uv - mod(uv, pixelSize) + .5*pixelSize)/pixelSize;
+    if(any(lessThan(xij, vec2(0))) || any(greaterThanEqual(xij, vec2({width},{height})))) return 1.;
+    uint bit = ({glyphSlot}) * {pixelCount}u + {width}u * ({heightMinusOne}u - uint(xij.y)) + uint(xij.x);
+    return bool(({uniqueFontId}[bit >> 5u] >> (31u - (bit & 31u))) & 1u) ? -1. : 1.;
+}}
+
+'''
+
+TextTemplate = '''uint decode_single(uint byteIndex, uint data) {{
+    return (data >> (8u * byteIndex)) & 0xffu;
+}}
+
+uvec2 localIndices(uint globalByteIndex) {{
+    uint localByteIndex = globalByteIndex % 4u,
+        globalIntegerIndex = (globalByteIndex - localByteIndex) / 4u;
+    return uvec2(globalIntegerIndex, localByteIndex);
+}}
+
+float d{uniqueFontId}_text(vec2 uv, uint index, float pixelSize) {{
+    float glyphSize = {widthPlusOne}.*pixelSize,
+        x = mod(uv.x, glyphSize),
+        xi = (uv.x - x)/glyphSize;
+       
+    uvec2 localTextIndices = localIndices({uniqueFontId}_text_offsets[index]);
+    uint textSize = decode_single(localTextIndices.y, {uniqueFontId}_text_strings[localTextIndices.x]);
+    localTextIndices = localIndices({uniqueFontId}_text_offsets[index] + uint(xi) + 1u);
+    return (xi < 0. || xi >= float(textSize) || abs(uv.y-.5*{height}.*pixelSize) > {height}.*pixelSize) ? 1. : d{uniqueFontId}(vec2(x, uv.y), decode_single(localTextIndices.y, {uniqueFontId}_text_strings[localTextIndices.x]), pixelSize);
+}}
+
+'''
+
+BitwiseTextTemplate = '''uint {uniqueFontId}_text_byte(uint globalByteIndex) {{
+    return ({uniqueFontId}_text_strings[{textWordIndex}] >> ((globalByteIndex & 3u) << 3u)) & 0xffu;
+}}
+
+float d{uniqueFontId}_text(vec2 uv, uint index, float pixelSize) {{
+    float glyphSize = {widthPlusOne}.*pixelSize,
+        x = mod(uv.x, glyphSize),
+        xi = (uv.x - x)/glyphSize;
+
+    uint offset = {uniqueFontId}_text_offsets[index],
+        textSize = {textSize};
+    return (xi < 0. || xi >= float(textSize) || abs(uv.y-.5*{height}.*pixelSize) > {height}.*pixelSize) ? 1. : d{uniqueFontId}(vec2(x, uv.y), {uniqueFontId}_text_byte(offset + uint(xi) + 1u), pixelSize);
+}}
+
+'''
+
+UintTemplate = '''uint log10(uint v) {{
+    return v < 10u ? 1u
+        : v < 100u ? 2u
+        : v < 1000u ? 3u
+        : v < 10000u ? 4u
+        : v < 100000u ? 5u
+        : v < 1000000u ? 6u
+        : v < 10000000u ? 7u
+        : v < 100000000u ? 8u
+        : 9u;
+}}
+
+uint pow10(uint v) {{
+    return v == 0u ? 1u
+        : v == 1u ? 10u
+        : v == 2u ? 100u
+        : v == 3u ? 1000u
+        : v == 4u ? 10000u
+        : v == 5u ? 100000u
+        : v == 6u ? 1000000u
+        : v == 7u ? 10000000u
+        : v == 8u ? 100000000u
+        : 1000000000u;
+}}
+
+float d{uniqueFontId}_uint(vec2 uv, uint number, float pixelSize) {{
+    uint numberWidth = max(log10(number), 1u);
+
+    float glyphSize = {widthPlusOne}. * pixelSize,
+        x = mod(uv.x, glyphSize),
+        xi = (uv.x - x) / glyphSize + float(10u - numberWidth);
+
+    uint digitIndex = uint(xi),
+        digit = number / pow10(9u - digitIndex);
+        
+    return xi < 0. || xi > 9. || abs(uv.y-.5*glyphSize) > {height}.*pixelSize || digitIndex < 10u - numberWidth
+        ? 1.
+        : d{uniqueFontId}(vec2(x, uv.y), 48u + digit % 10u, pixelSize);
+}}
+
+'''
+
+DigitTableUintTemplate = '''const uint {uniqueFontId}_pow10[10] = uint[10](1u, 10u, 100u, 1000u, 10000u, 100000u, 1000000u, 10000000u, 100000000u, 1000000000u);
+
+float d{uniqueFontId}_uint(vec2 uv, uint number, float pixelSize) {{
+    uint numberWidth = 1u + uint(number >= 10u) + uint(number >= 100u) + uint(number >= 1000u) + uint(number >= 10000u)
+        + uint(number >= 100000u) + uint(number >= 1000000u) + uint(number >= 10000000u) + uint(number >= 100000000u);
+
+    float glyphSize = {widthPlusOne}. * pixelSize,
+        x = mod(uv.x, glyphSize),
+        xi = (uv.x - x) / glyphSize + float(10u - numberWidth);
+
+    uint digitIndex = uint(xi),
+        digit = number / {uniqueFontId}_pow10[min(9u - digitIndex, 9u)];
+
+    return xi < 0. || xi > 9. || abs(uv.y-.5*glyphSize) > {height}.*pixelSize || digitIndex < 10u - numberWidth
+        ? 1.
+        : d{uniqueFontId}(vec2(x, uv.y), 48u + digit % 10u, pixelSize);
+}}
+
+'''
+
+NumberTemplate = '''float d{uniqueFontId}_int(vec2 uv, int number, float pixelSize) {{
+    float glyphSize = {widthPlusOne}. * pixelSize,
+        x = mod(uv.x, glyphSize),
+        xi = (uv.x - x) / glyphSize;
+
+    return uint(xi) == 0u && number < 0
+        ? d{uniqueFontId}(uv, 45u, pixelSize)
+        : d{uniqueFontId}_uint(uv - vec2(glyphSize*float(number < 0),0.), uint(abs(number)), pixelSize);
+}}
+
+float d{uniqueFontId}_float(vec2 uv, float number, uint _precision, float pixelSize) {{
+    float glyphSize = {widthPlusOne}. * pixelSize,
+        x = mod(uv.x, glyphSize),
+        xi = (uv.x - x) / glyphSize;
+
+    if(int(xi) < 0) return 1.;
+
+    if(uint(xi) == 0u && number < 0.)
+        return d{uniqueFontId}(uv, 45u, pixelSize);
+
+    uv.x -= glyphSize * float(number < 0.);
+    number = abs(number);
+
+    int exponent = number == 0. ? 0 : int(floor(log(number)/log(10.)));
+
+    x = mod(uv.x, glyphSize);
+    xi = (uv.x - x) / glyphSize;
+
+    return uint(xi) == 0u
+        ? d{uniqueFontId}(vec2(x, uv.y), 48u + uint(floor(number/pow(10., float(exponent)))) % 10u, pixelSize)
+        : uint(xi) == 1u
+            ? d{uniqueFontId}(vec2(x, uv.y), 46u, pixelSize)
+            : uint(xi) < _precision + 1u
+                ? d{uniqueFontId}(vec2(x, uv.y), 48u + uint(floor(number/pow(10., float(exponent)-xi+1.))) % 10u, pixelSize)
+                : uint(xi) == _precision + 1u
+                    ? d{uniqueFontId}(vec2(x, uv.y), 69u, pixelSize)
+                    : d{uniqueFontId}_int(vec2(uv.x - float(_precision + 2u) * glyphSize, uv.y), exponent, pixelSize);
+}}
+
+'''
+
+MainTemplate = '''void mainImage(out vec4 fragColor, vec2 fragCoord) {{
+    vec2 uv = (fragCoord-.5*iResolution.xy)/iResolution.y;
+    fragColor = vec4(1);
+    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}(uv+vec2(.5*iResolution.x/iResolution.y,0.)-{heightPlusOne}.*.01*vec2(0.,1.), 66u, .01), 0.));
+    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_text(uv+vec2(.5*iResolution.x/iResolution.y,0.), 0u, .005), 0.));
+    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_uint(uv+vec2(.5*iResolution.x/iResolution.y,0.)+{heightPlusOne}.*.01*vec2(0.,1.), uint(iFrame), .01), 0.));
+    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_int(uv+vec2(.5*iResolution.x/iResolution.y,0.)+{heightPlusOne}.*.01*vec2(0.,2.), int(-iFrame), .01), 0.));
+    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_float(uv+vec2(.5*iResolution.x/iResolution.y,0.)+{heightPlusOne}.*.01*vec2(0.,3.), iTime, 5u, .01), 0.));
+}}
+
+'''
+
+def fontId(shaderFileName: str) -> str:
+    return basename(shaderFileName).replace(' ', '_').replace('.', '_')
+
+def alignWidth(numberString: str) -> str:
+    return ' '*(11-len(numberString)) + numberString
+
+@lru_cache(maxsize=1 << 16)
+def glyphDataLine(records: Tuple[Tuple[int, int], ...]) -> str:
+    return '/** {:4} **/ '.format(''.join(map(
+        lambda record: chr(record[0]) if 32 <= record[0] < 127 else ' ',
+        records,
+    )).replace('*/', '* ')) + ', '.join(map(
+        lambda record: alignWidth('{}u'.format(record[1])),
+        records,
+    ))
+
+@lru_cache(maxsize=1 << 16)
+def textOffsetLine(offsets: Tuple[int, ...]) -> str:
+    return ', '.join(map(
+        lambda num: alignWidth('{}u'.format(num)),
+        offsets,
+    ))
+
+@lru_cache(maxsize=1 << 16)
+def textDataLine(words: Tuple[int, ...]) -> str:
+    return '/** {:16} **/ '.format(''.join(map(
+        lambda num: TextWord.pack(num).decode('latin-1'),
+        words,
+    ))).replace('\n', ' ').replace('\t', ' ').replace('\r', ' ').replace('\0', ' ') + ', '.join(map(
+        lambda num: alignWidth('{}u'.format(num)),
+        words,
+    ))
+
+@lru_cache(maxsize=1 << 16)
+def packedTextDataLine(words: Tuple[int, ...]) -> str:
+    comment, values = textDataLine(words).split(' **/ ', 1)
+    return '{} **/ uvec4({})'.format(comment, values)
+
+def chunked(values: list, width: int) -> List[tuple]:
+    return [tuple(values[i:i + width]) for i in range(0, len(values), width)]
+
+class ShaderStrategy:
+    # Code generation switches. The defaults reproduce the original, most
+    # compact template; every switch trades some source or data size for
+    # fewer instructions per fragment and renders the same pixels.
+    #
+    #   branchlessGlyphs  select-based bit extraction in d<font>
+    #   bitwiseText       shift/mask text addressing instead of % and /
+    #   packedText        text words as uvec4 (implies bitwiseText)
+    #   lineLengths       precomputed line length table (implies bitwiseText)
+    #   constantData      const data arrays, so literal lookups fold
+    #   digitTable        branch-free digit count and a pow10 table in d<font>_uint
+    def __init__(self,
+        branchlessGlyphs: bool = False,
+        bitwiseText: bool = False,
+        packedText: bool = False,
+        lineLengths: bool = False,
+        constantData: bool = False,
+        digitTable: bool = False,
+    ) -> None:
+        self.branchlessGlyphs = branchlessGlyphs
+        self.bitwiseText = bitwiseText or packedText or lineLengths
+        self.packedText = packedText
+        self.lineLengths = lineLengths
+        self.constantData = constantData
+        self.digitTable = digitTable
+
+    def key(self) -> Tuple[bool, ...]:
+        return (
+            self.branchlessGlyphs,
+            self.bitwiseText,
+            self.packedText,
+            self.lineLengths,
+            self.constantData,
+            self.digitTable,
+        )
+
+Strategies = {
+    'size': ShaderStrategy(),
+    'speed': ShaderStrategy(
+        branchlessGlyphs=True,
+        packedText=True,
+        lineLengths=True,
+        constantData=True,
+        digitTable=True,
+    ),
+}
+
+def glyphStream(
+    words: List[int],
+    shape: GlyphShape,
+) -> List[int]:
+    # Drops the padding bits of every glyph word and regroups the pixels
+    # into uints; the last one is zero padded.
+    padding = shape.wordBits - shape.pixelCount
+    bits = ''.join(format(word >> padding, '0{}b'.format(shape.pixelCount)) for word in words)
+    bits += '0' * (-len(bits) % 32)
+    if not bits:
+        return []
+    return list(struct.unpack('>{}I'.format(len(bits) // 32), int(bits, 2).to_bytes(len(bits) // 8, 'big')))
+
+def glyphMappings(
+    glyphs: List[Tuple[int, int]],
+) -> Dict[str, dict]:
+    # Candidate ordinal to slot mappings for sorted (ordinal, word) pairs.
+    # Every mapping covers all ordinals from the first to the last glyph
+    # and lists its slots as (ordinal shown in the comment, word).
+    if not glyphs:
+        return {'direct': {'kind': 'direct', 'firstOrdinal': 0, 'lastOrdinal': -1, 'glyphs': [], 'table': []}}
+
+    words = dict(glyphs)
+    first, last = glyphs[0][0], glyphs[-1][0]
+
+    # Distinct glyphs are found by hashing their words; slots are assigned
+    # in ordinal order, so runs of distinct glyphs get consecutive slots.
+    slotOfWord: Dict[int, int] = {}
+    unique = []
+    slots = []
+    for ordinal in range(first, last + 1):
+        word = words.get(ordinal, 0)
+        if word not in slotOfWord:
+            slotOfWord[word] = len(unique)
+            unique.append((ordinal, word))
+        slots.append(slotOfWord[word])
+
+    slotBits = 1
+    while (1 << slotBits) < len(unique):
+        slotBits *= 2
+    slotsPerWord = 32 // slotBits
+    index = [
+        sum(slot << (slotBits * j) for j, slot in enumerate(slots[i:i + slotsPerWord]))
+        for i in range(0, len(slots), slotsPerWord)
+    ]
+
+    span = {'firstOrdinal': first, 'lastOrdinal': last}
+    mappings = {
+        'direct': {'kind': 'direct', **span, 'glyphs': [(ordinal, words.get(ordinal, 0)) for ordinal in range(first, last + 1)], 'table': []},
+        'index': {'kind': 'index', **span, 'glyphs': unique, 'table': index, 'slotBits': slotBits},
+    }
+
+    # A range word holds its first ordinal in 8 bits and its first slot in
+    # 15, so larger fonts only get the other mappings.
+    if last > 0xff or len(unique) > 0x8000:
+        return mappings
+
+    ranges = []
+    start = 0
+    while start < len(slots):
+        end = start + 1
+        step = int(end < len(slots) and slots[end] == slots[start] + 1)
+        while end < len(slots) and end - start < 0x100 and slots[end] == slots[start] + step * (end - start):
+            end += 1
+        ranges.append((first + start) | (end - start - 1) << 8 | slots[start] << 16 | step << 31)
+        start = end
+
+    mappings['ranges'] = {'kind': 'ranges', **span, 'glyphs': unique, 'table': ranges}
+    return mappings
+
+def glyphSource(
+    tables: dict,
+    uniqueFontId: str,
+    constant: str = '',
+) -> str:
+    # The glyph data and slot mapping part of the shader.
+    stream = tables['glyphStream']
+    slotBits = tables.get('slotBits', 1)
+    return (FontDataTemplate + SlotTemplates[tables['mapping']]).format(
+        uniqueFontId = uniqueFontId,
+        constant = constant,
+        glyphDataSize = len(tables['glyphs']) if stream is None else len(stream),
+        dataLines = ',\n    '.join(map(
+            glyphDataLine,
+            chunked(tables['glyphs'], 4),
+        )) if stream is None else ',\n    '.join(map(
+            textOffsetLine,
+            chunked(stream, 4),
+        )),
+        firstOrdinal = tables['firstOrdinal'],
+        slotDataSize = len(tables['slotTable']),
+        slotDataLines = ',\n    '.join(map(
+            textOffsetLine,
+            chunked(tables['slotTable'], 4),
+        )),
+        slotBits = slotBits,
+        slotMask = (1 << slotBits) - 1,
+        slotIndexMask = 32 // slotBits - 1,
+        slotWordShift = (32 // slotBits).bit_length() - 1,
+    )
+
+def glyphSlot(
+    tables: dict,
+    uniqueFontId: str,
+) -> str:
+    if tables['mapping'] == 'direct':
+        return 'ordinal - {}u'.format(tables['firstOrdinal'])
+    return '{}_slot(ordinal)'.format(uniqueFontId)
+
+def glyphTables(
+    font: Font,
+    mapping: Optional[str] = None,
+) -> dict:
+    shape = font.shape()
+    candidates = []
+    for candidate in glyphMappings([(glyph._ordinal, glyph.toUnsignedInt()) for glyph in font.sortedGlyphs()]).values():
+        glyphs = candidate['glyphs']
+        stream = None
+        if shape.pixelCount > 31:
+            stream = glyphStream([word for ordinal, word in glyphs], shape)
+        else:
+            glyphs = [(ordinal, word << (32 - shape.wordBits)) for ordinal, word in glyphs]
+
+        tables = {
+            'mapping': candidate['kind'],
+            'glyphs': glyphs,
+            'glyphStream': stream,
+            'firstOrdinal': candidate['firstOrdinal'],
+            'lastOrdinal': candidate['lastOrdinal'],
+            'slotTable': candidate['table'],
+            'slotBits': candidate.get('slotBits', 1),
+        }
+        if mapping is None or mapping == candidate['kind']:
+            candidates.append((len(glyphSource(tables, 'font')), tables))
+
+    # Ties keep the earlier, simpler mapping.
+    if not candidates:
+        raise ValueError('Glyph mapping {} is unknown or cannot hold this font.'.format(mapping))
+    return min(candidates, key=lambda candidate: candidate[0])[1]
+
+GenerationPhases = 3
+
+def shaderTables(
+    font: Font,
+    text: Text,
+    strategy: ShaderStrategy = Strategies['size'],
+    mergeText: bool = False,
+    mapping: Optional[str] = None,
+    progress: Optional[Progress] = None,
+) -> dict:
+    # `progress` counts the phases of `generateShader`.
+    reportProgress(progress, 0, GenerationPhases)
+    with instrument.span('shaderTables.text'):
+        offsets, words = text.pack(merge=mergeText)
+        if strategy.packedText:
+            words = words + [0] * (-len(words) % 4)
+    reportProgress(progress, 1, GenerationPhases)
+    with instrument.span('shaderTables.glyphs'):
+        glyphs = glyphTables(font, mapping)
+
+    return {
+        **glyphs,
+        'shape': font.shape(),
+        'textOffsets': offsets,
+        'textWords': words,
+        'textLengths': list(map(len, text.lines())) if strategy.lineLengths else None,
+    }
+
+def generateShader(
+    font: Font,
+    text: Text,
+    uniqueFontId: str,
+    mergeText: bool = False,
+    strategy: ShaderStrategy = Strategies['size'],
+    mapping: Optional[str] = None,
+    progress: Optional[Progress] = None,
+) -> str:
+    # The per-line formatters are memoized on the packed data they print,
+    # so re-exporting a mostly unchanged font or table reuses their lines.
+    # `progress` is called between the text, glyph and format phases.
+    tables = shaderTables(font, text, strategy, mergeText, mapping, progress)
+    words = tables['textWords']
+    shape = tables['shape']
+    stream = tables['glyphStream']
+
+    template = ''.join((
+        HeaderTemplate,
+        '{glyphSource}',
+        TextOffsetTemplate,
+        TextLengthTemplate if strategy.lineLengths else '',
+        PackedTextStringTemplate if strategy.packedText else TextStringTemplate,
+        StreamGlyphTemplate if stream is not None else BranchlessGlyphTemplate if strategy.branchlessGlyphs else GlyphTemplate,
+        BitwiseTextTemplate if strategy.bitwiseText else TextTemplate,
+        DigitTableUintTemplate if strategy.digitTable else UintTemplate,
+        NumberTemplate,
+        MainTemplate,
+    ))
+
+    reportProgress(progress, 2, GenerationPhases)
+    with instrument.span('generateShader.format'):
+        source = template.format(
+            uniqueFontId = uniqueFontId,
+            constant = 'const ' if strategy.constantData else '',
+            glyphSource = glyphSource(tables, uniqueFontId, 'const ' if strategy.constantData else ''),
+            glyphSlot = glyphSlot(tables, uniqueFontId),
+            width = shape.width,
+            widthPlusOne = shape.width + 1,
+            height = shape.height,
+            heightPlusOne = shape.height + 1,
+            heightMinusOne = shape.height - 1,
+            pixelCount = shape.pixelCount,
+            glyphShift = 31 - shape.pixelCount,
+            glyphRowShift = shape.width + 31 - shape.pixelCount,
+            textCount = text.lineCount(),
+            textOffsetLines = ',\n    '.join(map(
+                textOffsetLine,
+                chunked(tables['textOffsets'], 4),
+            )),
+            textLengthLines = ',\n    '.join(map(
+                textOffsetLine,
+                chunked(tables['textLengths'] or [], 4),
+            )),
+            textDataSize = len(words) // 4 if strategy.packedText else len(words),
+            textDataLines = ',\n    '.join(map(
+                packedTextDataLine if strategy.packedText else textDataLine,
+                chunked(words, 4),
+            )),
+            textWordIndex = 'globalByteIndex >> 4u][(globalByteIndex >> 2u) & 3u' if strategy.packedText else 'globalByteIndex >> 2u',
+            textSize = '{}_text_lengths[index]'.format(uniqueFontId) if strategy.lineLengths else '{}_text_byte(offset)'.format(uniqueFontId),
+        )
+    reportProgress(progress, GenerationPhases, GenerationPhases)
+    return source
+
+# Glyphs drawn by d<font>_uint, _int and _float.
+NumberCharacters = '0123456789-.E'
+
+def usedOrdinals(
+    text: Text,
+    extra: str = NumberCharacters,
+) -> List[int]:
+    # One pass over all characters; building the set runs in C.
+    return sorted(map(ord, set(''.join(text.lines())).union(extra)))
+
+def subsetFont(
+    font: Font,
+    text: Text,
+    extra: str = NumberCharacters,
+) -> Font:
+    # Only the glyphs the text table and `extra` use; the export then maps
+    # the remaining ordinals to their slots.
+    subset = Font([], font.shape())
+    for ordinal in usedOrdinals(text, extra):
+        glyph = font.glyphWithOrdinal(ordinal)
+        if glyph is not None:
+            subset.addGlyph(Glyph.withWord(ordinal, glyph._word, font.shape()))
+    return subset
+
+def subsetSavings(
+    font: Font,
+    subset: Font,
+    uniqueFontId: str,
+    strategy: ShaderStrategy = Strategies['size'],
+) -> int:
+    # Bytes of shader source saved by exporting `subset` instead of `font`;
+    # only the glyph tables and the slot lookup differ.
+    constant = 'const ' if strategy.constantData else ''
+
+    def size(font: Font) -> int:
+        tables = glyphTables(font)
+        return len(glyphSource(tables, uniqueFontId, constant)) + len(glyphSlot(tables, uniqueFontId))
+
+    return size(font) - size(subset)
+
+# Cached exports are only valid for the generator that wrote them. The
+# version covers every template; bump `GeneratorRevision` whenever the
+# generating code changes its output.
+GeneratorRevision = 1
+
+def generatorVersion() -> str:
+    digest = sha256(str(GeneratorRevision).encode('ascii'))
+    for name, value in sorted(globals().items()):
+        if name.endswith('Template') and isinstance(value, str):
+            digest.update(name.encode('ascii'))
+            digest.update(value.encode('utf-8'))
+    return digest.hexdigest()
+
+GeneratorVersion = generatorVersion()
+
+def contentKey(
+    font: Font,
+    text: Text,
+    uniqueFontId: str,
+    **options,
+) -> str:
+    digest = sha256()
+    for part in (
+        GeneratorVersion.encode('ascii'),
+        encodeFont(((glyph._ordinal, glyph._word) for glyph in font.sortedGlyphs()), font.shape()),
+        text.toBytes(),
+        repr((uniqueFontId, sorted(options.items()))).encode('utf-8'),
+    ):
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+def writeShader(
+    font: Font,
+    text: Text,
+    shaderFileName: str,
+    mergeText: bool = False,
+    strategy: ShaderStrategy = Strategies['size'],
+    progress: Optional[Progress] = None,
+) -> bool:
+    # `progress` follows the generation phases, then the bytes compared
+    # and written; it may raise to abort, leaving the output untouched.
+    source = generateShader(font, text, fontId(shaderFileName), mergeText, strategy, progress=progress)
+
+    # Leave an identical output untouched so that its mtime does not
+    # trigger shader reloads or rebuilds downstream.
+    with instrument.span('writeShader.compare'):
+        if exists(shaderFileName) and readFile(shaderFileName, progress, binary=False) == source:
+            return False
+
+    with instrument.span('writeShader.write'):
+        writeFile(shaderFileName, source, progress)
+    return True
+
+class ExportCache:
+    IndexFileName = 'exportcache.json'
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self._directory = directory
+        self._entries: Dict[str, dict] = {}
+        if directory is not None and exists(join(directory, ExportCache.IndexFileName)):
+            with open(join(directory, ExportCache.IndexFileName), "rt") as f:
+                self._entries = json.load(f)
+
+    def _outputState(self, shaderFileName: str) -> Optional[List[int]]:
+        if not exists(shaderFileName):
+            return None
+        result = stat(shaderFileName)
+        return [result.st_size, result.st_mtime_ns]
+
+    def writeShader(self,
+        font: Font,
+        text: Text,
+        shaderFileName: str,
+        mergeText: bool = False,
+        strategy: ShaderStrategy = Strategies['size'],
+    ) -> bool:
+        path = abspath(shaderFileName)
+        key = contentKey(font, text, fontId(shaderFileName), mergeText=mergeText, strategy=strategy.key())
+        entry = self._entries.get(path)
+
+        if entry is not None and entry['key'] == key and entry['output'] == self._outputState(path):
+            return False
+
+        written = writeShader(font, text, shaderFileName, mergeText, strategy)
+        self._entries[path] = {
+            'key': key,
+            'output': self._outputState(path),
+        }
+        return written
+
+    def save(self) -> None:
+        if self._directory is None:
+            return
+
+        makedirs(self._directory, exist_ok=True)
+        with open(join(self._directory, ExportCache.IndexFileName), "wt") as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True)
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = ArgumentParser(description='Export an ALDI pixel font and text table to GLSL.')
+    parser.add_argument('font', help='Font file (.apf or .apfc).')
+    parser.add_argument('text', help='Text table file (.att or .apfc).')
+    parser.add_argument('-o', '--output', help='Fragment shader to write; defaults to the font name with a .frag extension.')
+    parser.add_argument('--cache', help='Directory for the export cache index; skips exports whose inputs and output are unchanged.')
+    parser.add_argument('--merge-text', action='store_true', help='Share storage between identical lines and lines that are suffixes of others.')
+    parser.add_argument('--strategy', choices=sorted(Strategies), default='size', help='Generate the compact (size) or the fragment-speed optimized (speed) shader variant.')
+    parser.add_argument('--subset', nargs='?', const=NumberCharacters, metavar='EXTRA', help='Only export glyphs used by the text table or listed in EXTRA (default: the digits, "-", "." and "E" used by the number functions).')
+    args = parser.parse_args(arguments)
+
+    font = loadFont(args.font)
+    if font is None:
+        parser.error('{} holds no font.'.format(args.font))
+    text = loadText(args.text)
+    if text is None:
+        parser.error('{} holds no text table.'.format(args.text))
+    shaderFileName = args.output or splitext(args.font)[0] + '.frag'
+    if args.subset is not None:
+        subset = subsetFont(font, text, args.subset)
+        print('Kept {} of {} glyphs, saved {} bytes.'.format(
+            subset.glyphCount(),
+            font.glyphCount(),
+            subsetSavings(font, subset, fontId(shaderFileName), Strategies[args.strategy]),
+        ))
+        font = subset
+
+    cache = ExportCache(args.cache)
+    cache.writeShader(
+        font,
+        text,
+        shaderFileName,
+        args.merge_text,
+        Strategies[args.strategy],
+    )
+    cache.save()
+
+if __name__ == '__main__':
+    main()
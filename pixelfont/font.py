@@ -1,7 +1,10 @@
 import construct
-from typing import Optional, List
+import instrument
+from typing import Optional, List, Dict, Union
 from glyph import *
+from codec import decodeFont, encodeFont
 from random import choice
+from bisect import bisect_left, insort
 
 class Font:
     BinarySaveFormat = construct.GreedyRange(
@@ -10,94 +13,238 @@ class Font:
 
     def __init__(self,
         ordinals: List[int] = range(32, 126),
+        shape: GlyphShape = Glyph.DefaultShape,
     ) -> None:
-        self._glyphs = list(map(
-            lambda ordinal: Glyph(ordinal),
+        self._shape = shape
+        self._setGlyphs(map(
+            lambda ordinal: Glyph(ordinal, shape=shape),
             ordinals,
         ))
 
+    def _setGlyphs(self, glyphs) -> None:
+        # Glyphs are keyed by ordinal; `_ordinals` is the same key set kept
+        # sorted so that ordered access never has to re-sort.
+        self._glyphs: Dict[int, Union[Glyph, int]] = {}
+        for glyph in glyphs:
+            self._glyphs.setdefault(glyph._ordinal, glyph)
+        self._ordinals: List[int] = sorted(self._glyphs)
+        self._source = None
+
+    def _setSource(self, source) -> None:
+        # Glyphs of a mapped container stay undecoded until first access;
+        # until then their `_glyphs` entry is the record index in `source`.
+        self._glyphs = {ordinal: index for index, ordinal in enumerate(source.ordinals())}
+        self._ordinals = sorted(self._glyphs)
+        self._source = source
+        self._shape = source.shape()
+
+    def _resolve(self,
+        ordinal: int,
+    ) -> Optional[Glyph]:
+        glyph = self._glyphs.get(ordinal)
+        if isinstance(glyph, int):
+            glyph = self._source.glyph(glyph)
+            self._glyphs[ordinal] = glyph
+        return glyph
+
+    def copy(self) -> 'Font':
+        # Decoded glyphs are copied; undecoded records keep pointing into
+        # the read-only source, which is safe to share.
+        font = Font([], self._shape)
+        font._glyphs = {
+            ordinal: glyph if isinstance(glyph, int) else Glyph.withWord(ordinal, glyph._word, self._shape)
+            for ordinal, glyph in self._glyphs.items()
+        }
+        font._ordinals = list(self._ordinals)
+        font._source = self._source
+        return font
+
+    def sortedGlyphs(self) -> List[Glyph]:
+        glyphs = list(map(
+            self._resolve,
+            self._ordinals,
+        ))
+        self._source = None
+        return glyphs
+
+    def wordData(self) -> bytes:
+        # Big-endian words of whole bytes in ordinal order, as in the
+        # container. Records of a mapped source are copied undecoded.
+        size = self._shape.wordBytes
+        records = self._source.wordData() if self._source is not None else b''
+        return b''.join(
+            records[glyph * size:(glyph + 1) * size] if isinstance(glyph, int) else glyph._word.to_bytes(size, 'big')
+            for glyph in map(self._glyphs.__getitem__, self._ordinals)
+        )
+
     def toBytes(self) -> bytes:
-        return Font.BinarySaveFormat.build(list(map(
-            lambda glyph: glyph.toObject(),
-            self._glyphs,
-        )))
+        self.sortedGlyphs()
+        return encodeFont(map(
+            lambda glyph: (glyph._ordinal, glyph._word),
+            self._glyphs.values(),
+        ), self._shape)
     
     def fromBytes(self,
         data: bytes,
     ):
-        self._glyphs = list(map(
-            lambda glyphConstruct: Glyph(glyphConstruct['ordinal'], glyphConstruct['pixels']),
-            Font.BinarySaveFormat.parse(data),
+        self._shape, records = decodeFont(data)
+        self._setGlyphs(map(
+            lambda record: Glyph.withWord(*record, self._shape),
+            records,
         ))
 
+    def shape(self) -> GlyphShape:
+        return self._shape
+
+    def setShape(self,
+        shape: GlyphShape,
+    ) -> None:
+        # Keeps the top left corner of every glyph, cropping or padding the
+        # other edges.
+        width = min(shape.width, self._shape.width)
+        for glyph in self.sortedGlyphs():
+            pixels = glyph.pixels()
+            resized = []
+            for y in range(shape.height):
+                row = pixels[y * self._shape.width:y * self._shape.width + width] if y < self._shape.height else []
+                resized += row + [False] * (shape.width - len(row))
+            glyph._shape = shape
+            glyph._word = Glyph.packPixels(resized, shape)
+        self._shape = shape
+
     def ordinals(self) -> List[int]:
-        return sorted(list(map(
-            lambda glyph: glyph._ordinal,  
-            self._glyphs,
-        )))
+        return list(self._ordinals)
+
+    def ordinalAt(self,
+        index: int,
+    ) -> int:
+        return self._ordinals[index]
+
+    def indexOfOrdinal(self,
+        ordinal: int,
+    ) -> int:
+        index = bisect_left(self._ordinals, ordinal)
+        if index < len(self._ordinals) and self._ordinals[index] == ordinal:
+            return index
+        return -1
+
+    def insertionIndex(self,
+        ordinal: int,
+    ) -> int:
+        return bisect_left(self._ordinals, ordinal)
+
+    def hasOrdinal(self,
+        ordinal: int,
+    ) -> bool:
+        return ordinal in self._glyphs
 
     def glyphWithOrdinal(self,
         ordinal: int,
     ) -> Glyph:
-        result = list(filter(
-            lambda glyph: glyph._ordinal == ordinal,
-            self._glyphs,
-        ))
-
-        if result == []:
-            return None
-        
-        return result[0]
+        return self._resolve(ordinal)
 
     def renameGlyph(self,
         fromOrdinal: int,
         toOrdinal: int,
     ) -> bool:
-        if fromOrdinal not in self.ordinals():
+        if fromOrdinal not in self._glyphs:
             return False
 
-        if toOrdinal in self.ordinals():
+        if toOrdinal in self._glyphs:
             return False
 
-        self.glyphWithOrdinal(fromOrdinal)._ordinal = toOrdinal
+        glyph = self._resolve(fromOrdinal)
+        del self._glyphs[fromOrdinal]
+        del self._ordinals[self.indexOfOrdinal(fromOrdinal)]
+
+        glyph._ordinal = toOrdinal
+        self._glyphs[toOrdinal] = glyph
+        insort(self._ordinals, toOrdinal)
         
         return True
 
-    def addNewGlyph(self) -> int:
+    def newOrdinal(self) -> int:
         choices = list(filter(
-            lambda glyph: glyph not in self.ordinals(),
+            lambda ordinal: ordinal not in self._glyphs,
             range(127),
         ))
 
         if len(choices) == 0:
             return -1
 
-        ordinal = choice(choices)
-        self._glyphs.append(Glyph(ordinal))
+        return choice(choices)
+
+    def addGlyph(self,
+        glyph: Glyph,
+    ) -> bool:
+        if glyph.shape() != self._shape:
+            raise ValueError('Cannot add a {} glyph to a {} font.'.format(glyph.shape(), self._shape))
+        if glyph._ordinal in self._glyphs:
+            return False
+
+        self._glyphs[glyph._ordinal] = glyph
+        insort(self._ordinals, glyph._ordinal)
+
+        return True
+
+    def addNewGlyph(self) -> int:
+        ordinal = self.newOrdinal()
+
+        if ordinal == -1:
+            return -1
+
+        self.addGlyph(Glyph(ordinal, shape=self._shape))
         
         return ordinal
 
     def removeGlyph(self, ordinal: int) -> bool:
-        self._glyphs = list(filter(
-            lambda glyph: glyph._ordinal != ordinal,
-            self._glyphs,
-        ))
+        if self._glyphs.pop(ordinal, None) is None:
+            return False
+
+        del self._ordinals[self.indexOfOrdinal(ordinal)]
+
+        return True
 
     def glyphCount(self) -> int:
         return len(self._glyphs)
 
     def chunks(self, width: int) -> List[List[Glyph]]:
-        sortedGlyphs = list(map(
-            lambda ordinal: self.glyphWithOrdinal(ordinal),
-            self.ordinals(),
-        ))
+        sortedGlyphs = self.sortedGlyphs()
         return [sortedGlyphs[i:i + width] for i in range(0, len(sortedGlyphs), width)]
 
+instrument.register(Font, 'glyphWithOrdinal', 'sortedGlyphs', 'chunks', 'toBytes')
+
 if __name__ == '__main__':
     font = Font()
     font.glyphWithOrdinal(ord('a')).toggle(1, 1, True)
     serialized = font.toBytes()
 
+    assert serialized == Font.BinarySaveFormat.build([glyph.toObject() for glyph in font._glyphs.values()])
+
     font = Font()
     font.fromBytes(serialized)
     assert font.glyphWithOrdinal(ord('a')).isOn(1,1)
+
+    assert font.renameGlyph(ord('a'), 126)
+    assert font.glyphWithOrdinal(ord('a')) is None
+    assert font.glyphWithOrdinal(126).isOn(1, 1)
+    assert font.ordinalAt(font.glyphCount() - 1) == 126
+    assert font.removeGlyph(126) and not font.removeGlyph(126)
+    assert font.ordinals() == sorted(font.ordinals())
+    assert font.indexOfOrdinal(ord('A')) == ord('A') - 32
+    assert font.indexOfOrdinal(ord('a')) == -1
+
+    font.glyphWithOrdinal(ord('A')).toggle(4, 5, True)
+    font.setShape(GlyphShape(8, 8))
+    assert font.glyphWithOrdinal(ord('A')).isOn(4, 5) and not font.glyphWithOrdinal(ord('A')).isOn(7, 7)
+    resized = Font([])
+    resized.fromBytes(font.toBytes())
+    assert resized.shape() == GlyphShape(8, 8)
+    assert resized.toBytes() == font.toBytes()
+    assert resized.wordData() == b''.join(glyph._word.to_bytes(font.shape().wordBytes, 'big') for glyph in font.sortedGlyphs())
+    try:
+        font.addGlyph(Glyph(1))
+    except ValueError:
+        pass
+    else:
+        assert False
@@ -2,16 +2,27 @@ from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from PyQt6.QtWidgets import *
 from PyQt6 import uic
-from typing import Optional, List
+from typing import Any, Callable, Optional, List
 from sys import argv
 from glypheditor import GlyphEditor
+from glyphlistmodel import GlyphListModel
+from textlistmodel import TextListModel
+from fontpreview import FontPreview
+from history import History, Delta, GlyphDelta, LineDelta
+from autosave import Autosave
 from font import Font
-from glyph import Glyph
+from glyph import Glyph, GlyphShape
 from text import Text
+from jobs import openFont, openText, saveFont, saveText, exportShader, exportSubsetShader, importFontFile
+from tasks import Task
+from container import release
+import instrument
 from os.path import basename, dirname, join
 from os import listdir
 
 class FontEditor(QMainWindow):
+    autosaveFailed = pyqtSignal(str)
+
     def __init__(self,
         parent: Optional[QWidget] = None,
         flags: Qt.WindowType = Qt.WindowType.Window,
@@ -23,16 +34,108 @@ class FontEditor(QMainWindow):
         self.glyphEditor = GlyphEditor()
         self.centralWidget().layout().addWidget(self.glyphEditor)
 
+        self._glyphModel = GlyphListModel()
+        self.glyphListView.setModel(self._glyphModel)
+        # Icons share one size, so only visible rows are decoded and drawn.
+        self.glyphListView.setUniformItemSizes(True)
+        self.glyphListView.selectionModel().selectionChanged.connect(self._glyphTableSelectionChanged)
+        self.glyphEditor.glyphChanged.connect(self._glyphModel.glyphChanged)
+
+        self._textModel = TextListModel()
+        self.textListView.setUniformItemSizes(True)
+        self.textListView.setModel(self._textModel)
+        self.textListView.selectionModel().currentChanged.connect(self.sentenceSelected)
+
+        self.fontPreview = FontPreview()
+        previewDock = QDockWidget("Preview", self)
+        previewDock.setObjectName("previewDock")
+        previewDock.setWidget(self.fontPreview)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, previewDock)
+        self.glyphEditor.glyphChanged.connect(self.fontPreview.glyphChanged)
+        self._glyphModel.modelReset.connect(lambda: self.fontPreview.setPixelFont(self._glyphModel.font()))
+        self._glyphModel.rowsInserted.connect(self.fontPreview.pixelFontChanged)
+        self._glyphModel.rowsRemoved.connect(self.fontPreview.pixelFontChanged)
+        self._glyphModel.rowsMoved.connect(self.fontPreview.pixelFontChanged)
+        self._glyphModel.dataChanged.connect(self._glyphDataChanged)
+        self._textModel.modelReset.connect(lambda: self.fontPreview.setText(self._textModel.text()))
+        self._textModel.rowsInserted.connect(self.fontPreview.textChanged)
+        self._textModel.rowsRemoved.connect(self.fontPreview.textChanged)
+        self._textModel.dataChanged.connect(self.fontPreview.textChanged)
+
+        # Structural glyph changes (add, remove, rename) are not journaled,
+        # so they start a fresh history like loading a font does.
+        self._history = History(self._applyDelta)
+        self.glyphEditor.glyphStroked.connect(lambda ordinal, mask: self._history.record(GlyphDelta(ordinal, mask)))
+        self._textModel.linePatched.connect(lambda row, before, after: self._history.record(LineDelta(row, before, after)))
+        self._glyphModel.modelReset.connect(self._history.clear)
+        self._glyphModel.rowsInserted.connect(self._history.clear)
+        self._glyphModel.rowsRemoved.connect(self._history.clear)
+        self._glyphModel.rowsMoved.connect(self._history.clear)
+        self._textModel.modelReset.connect(self._history.clear)
+
+        self._tasks: List[Task] = []
+        self._taskProgressBar = QProgressBar()
+        self._taskProgressBar.setMaximumWidth(200)
+        self._taskProgressBar.hide()
+        self._cancelTasksButton = QPushButton("Cancel")
+        self._cancelTasksButton.clicked.connect(self.cancelTasks)
+        self._cancelTasksButton.hide()
+        self.statusBar().addPermanentWidget(self._taskProgressBar)
+        self.statusBar().addPermanentWidget(self._cancelTasksButton)
+
+        # Fonts and text tables opened from a container keep it mapped until
+        # they are replaced; releasing detaches it, so copies still held by
+        # tasks stay usable.
+        self._font = Font([])
+        self._text = Text()
         self.fileNew()
 
+        # Every editor autosaves into its own session and only recovers
+        # sessions of editors that are gone. Failures are reported from the
+        # autosave thread, so they go through a queued signal.
+        self.autosaveFailed.connect(lambda message: self.statusBar().showMessage(message))
+        self._autosave = Autosave(
+            join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation), 'autosave'),
+            onError=lambda error: self.autosaveFailed.emit("Autosave failed: {}".format(error)),
+        )
+        try:
+            recovered = self._autosave.recover()
+        except Exception as error:
+            recovered = None
+            self.statusBar().showMessage("Could not recover the autosaved session: {}".format(error))
+        if recovered is not None:
+            self._font, self._text = recovered
+            self._updateGlyphTable()
+            self.updateTextTable()
+            self.statusBar().showMessage("Recovered the autosaved session.")
+        self._autosave.snapshot(self._font, self._text)
+
+        # Pixel and line edits are journaled; everything else compacts.
+        self.glyphEditor.glyphChanged.connect(lambda ordinal: self._autosave.glyphChanged(self._font.glyphWithOrdinal(ordinal)))
+        self._textModel.linePatched.connect(self._autosave.linePatched)
+        self._glyphModel.modelReset.connect(self._autosaveSnapshot)
+        self._glyphModel.rowsInserted.connect(self._autosaveSnapshot)
+        self._glyphModel.rowsRemoved.connect(self._autosaveSnapshot)
+        self._glyphModel.rowsMoved.connect(self._autosaveSnapshot)
+        self._textModel.modelReset.connect(self._autosaveSnapshot)
+
+        self._autosaveTimer = QTimer(self)
+        self._autosaveTimer.timeout.connect(self._autosaveCompact)
+        self._autosaveTimer.start(30000)
+
         self.actionExit.triggered.connect(self.exit)
         self.actionNew.triggered.connect(self.fileNew)
         self.actionOpen.triggered.connect(self.fileOpen)
+        self.actionImport.triggered.connect(self.fileImport)
         self.actionSave.triggered.connect(self.fileSave)
         self.actionSave_As.triggered.connect(self.fileSaveAs)
         self.actionAdd_Glyph.triggered.connect(self.addGlyph)
         self.actionRemove_Glyph.triggered.connect(self.removeCurrentGlyph)
+        self.actionGlyph_Size.triggered.connect(self.changeGlyphSize)
+        self.actionUndo.triggered.connect(self.undo)
+        self.actionRedo.triggered.connect(self.redo)
         self.actionExport_GLSL.triggered.connect(self.exportFont)
+        self.actionExport_GLSL_Used_Glyphs.triggered.connect(self.exportUsedGlyphs)
         self.actionAdd_Line.triggered.connect(self.addLine)
         self.actionSave_Text_As.triggered.connect(self.saveTextAs)
         self.actionLoad_Text.triggered.connect(self.loadText)
@@ -41,26 +144,27 @@ class FontEditor(QMainWindow):
 
     def fileNew(self) -> None:
         self._fileName = None
+        release(self._font)
+        release(self._text)
         self._font = Font()
         self._text = Text()
 
         self._updateGlyphTable()
+        self.updateTextTable()
 
     def fileSave(self) -> None:
         if not self._fileName:
             self.fileSaveAs()
             return
 
-        with open(self._fileName, "wb") as f:
-            f.write(self._font.toBytes())
-            f.close()
+        self._runTask("Saving " + basename(self._fileName), Task(saveFont, self._fileName, self._font.copy(), self._text.copy()))
 
     def fileSaveAs(self) -> None:
         (self._fileName, _) = QFileDialog.getSaveFileName(
             self,
             "Save font binary...",
             "~",
-            "ALDI Pixel Font Files (*.apf)",
+            "ALDI Pixel Font Files (*.apf);;ALDI Pixel Font Containers (*.apfc)",
         )
 
         if self._fileName != "":
@@ -71,36 +175,108 @@ class FontEditor(QMainWindow):
             self,
             "Open font binary...",
             "~",
-            "ALDI Pixel Font Files (*.apf)",
+            "ALDI Pixel Font Files (*.apf);;ALDI Pixel Font Containers (*.apfc)",
         )
 
         if self._fileName != "":
-            with open(self._fileName, "rb") as f:
-                self._font.fromBytes(f.read())
-                f.close()
+            self._runTask("Opening " + basename(self._fileName), Task(openFont, self._fileName), self._fontOpened)
 
-            self._updateGlyphTable()
+    def fileImport(self) -> None:
+        # Atlases are sliced into cells of the current glyph size, starting
+        # at the space character.
+        (importFileName, _) = QFileDialog.getOpenFileName(
+            self,
+            "Import font...",
+            "~",
+            "Sprite-Sheet Atlases (*.png *.ppm *.pgm *.pbm *.bmp *.gif);;BDF Fonts (*.bdf)",
+        )
+
+        if importFileName != "":
+            self._fileName = None
+            self._runTask("Importing " + basename(importFileName), Task(importFontFile, importFileName, shape=self._font.shape()), self._fontOpened)
+
+    def _fontOpened(self,
+        font: Font,
+    ) -> None:
+        release(self._font)
+        self._font = font
+        self._updateGlyphTable()
 
     def exit(self) -> None:
+        self._autosave.close()
         exit(0)
 
+    def closeEvent(self,
+        event: QCloseEvent,
+    ) -> None:
+        self._autosave.close()
+        super().closeEvent(event)
+
+    def _runTask(self,
+        message: str,
+        task: Task,
+        finished: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        # Work on snapshots or fresh files runs on the global thread pool;
+        # results come back to the GUI thread through the task's signals.
+        self._tasks.append(task)
+        task.signals.progress.connect(self._taskProgress)
+        task.signals.finished.connect(lambda result: self._taskDone(task, message + " done."))
+        if finished is not None:
+            task.signals.finished.connect(finished)
+        task.signals.failed.connect(lambda error: self._taskDone(task, message + " failed: " + error))
+        task.signals.cancelled.connect(lambda: self._taskDone(task, message + " cancelled."))
+
+        self.statusBar().showMessage(message + "...")
+        self._taskProgressBar.setRange(0, 0)
+        self._taskProgressBar.show()
+        self._cancelTasksButton.show()
+        QThreadPool.globalInstance().start(task)
+
+    def _taskProgress(self,
+        done: int,
+        total: int,
+    ) -> None:
+        if total > 0:
+            self._taskProgressBar.setRange(0, 1000)
+            self._taskProgressBar.setValue(done * 1000 // total)
+
+    def _taskDone(self,
+        task: Task,
+        message: str,
+    ) -> None:
+        self._tasks.remove(task)
+        self.statusBar().showMessage(message, 5000)
+        if len(self._tasks) == 0:
+            self._taskProgressBar.hide()
+            self._cancelTasksButton.hide()
+
+    def cancelTasks(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+    def _autosaveSnapshot(self) -> None:
+        self._autosave.snapshot(self._font, self._text)
+
+    def _autosaveCompact(self) -> None:
+        if self._autosave.pending() > 0:
+            self._autosaveSnapshot()
+
     def _updateGlyphTable(self) -> None:
-        newModel = QStringListModel(map(
-            lambda ordinal: chr(ordinal),
-            self._font.ordinals(),
-        ))
-        newModel.dataChanged.connect(self._glyphTableEdited)
-        self.glyphListView.setModel(newModel)
-        self.glyphListView.selectionModel().selectionChanged.connect(self._glyphTableSelectionChanged)
-        self.glyphListView.selectionModel().select(self.glyphListView.model().index(0), QItemSelectionModel.SelectionFlag.Select)
+        shape = self._font.shape()
+        self.glyphListView.setIconSize(QSize(shape.width * GlyphListModel.IconScale, shape.height * GlyphListModel.IconScale))
+        self._glyphModel.setFont(self._font)
+        self._selectGlyphRow(0)
 
-    def _glyphTableEdited(self,
-        topLeft: QModelIndex,
-        bottomRight: QModelIndex,
-        roles: List[int] = [Qt.ItemDataRole.EditRole],
+    def _selectGlyphRow(self,
+        row: int,
     ) -> None:
-        if self._font.renameGlyph(self._font.ordinals()[topLeft.row()], ord(topLeft.model().data(topLeft, Qt.ItemDataRole.EditRole))):
-            self._updateGlyphTable()
+        if self._font.glyphCount() == 0:
+            return
+
+        index = self._glyphModel.index(row)
+        self.glyphListView.selectionModel().select(index, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        self.glyphListView.scrollTo(index)
 
     def _glyphTableSelectionChanged(self,
         selected: QItemSelectionRange,
@@ -111,16 +287,65 @@ class FontEditor(QMainWindow):
         if len(selectedIndices) == 0:
             return
 
-        self.glyphEditor.setGlyph(self._font.glyphWithOrdinal(ord(selectedIndices[0].model().data(selectedIndices[0]))))
+        self.glyphEditor.setGlyph(self._font.glyphWithOrdinal(self._font.ordinalAt(selectedIndices[0].row())))
+
+    def undo(self) -> None:
+        self._history.undo()
+
+    def redo(self) -> None:
+        self._history.redo()
+
+    def _applyDelta(self,
+        delta: Delta,
+        forward: bool,
+    ) -> None:
+        if isinstance(delta, GlyphDelta):
+            glyph = self._font.glyphWithOrdinal(delta.ordinal)
+            glyph.fromUnsignedInt(glyph.toUnsignedInt() ^ delta.mask)
+            if self.glyphEditor.glyph() is glyph:
+                self.glyphEditor.update()
+            self.glyphEditor.glyphChanged.emit(delta.ordinal)
+            return
+
+        before, after = (delta.before, delta.after) if forward else (delta.after, delta.before)
+        if before is None:
+            self._textModel.insertLine(delta.index, after)
+        elif after is None:
+            self._textModel.removeLine(delta.index)
+        else:
+            self._textModel.setLine(delta.index, after)
+
+    def _glyphDataChanged(self,
+        topLeft: QModelIndex,
+        bottomRight: QModelIndex,
+        roles: List[int] = [],
+    ) -> None:
+        # Pixel edits only touch the decoration and reach the preview tile by
+        # tile through glyphChanged; anything else is a rename.
+        if list(roles) != [Qt.ItemDataRole.DecorationRole]:
+            self.fontPreview.pixelFontChanged()
+            self._history.clear()
+            self._autosaveSnapshot()
 
     def addGlyph(self) -> None:
-        ordinal = self._font.addNewGlyph()
+        row = self._glyphModel.addGlyph()
         
-        if ordinal == -1:
+        if row == -1:
             return
 
+        self._selectGlyphRow(row)
+
+    def changeGlyphSize(self) -> None:
+        shape = self._font.shape()
+        (width, ok) = QInputDialog.getInt(self, "Glyph Size", "Glyph width:", shape.width, 1, 0xff)
+        if not ok:
+            return
+        (height, ok) = QInputDialog.getInt(self, "Glyph Size", "Glyph height:", shape.height, 1, 0xff)
+        if not ok:
+            return
+
+        self._font.setShape(GlyphShape(width, height))
         self._updateGlyphTable()
-        self.glyphListView.selectionModel().select(self.glyphListView.model().index(self._font.ordinals().index(ordinal)), QItemSelectionModel.SelectionFlag.Select)
 
     def removeCurrentGlyph(self) -> None:
         if self.glyphListView.hasFocus():
@@ -129,30 +354,20 @@ class FontEditor(QMainWindow):
             if len(selectedIndices) == 0:
                 return
 
-            self._font.removeGlyph(ord(selectedIndices[0].model().data(selectedIndices[0])))
-            self._updateGlyphTable()
-            if self._font.glyphCount() > 0:
-                self.glyphListView.selectionModel().select(self.glyphListView.model().index(0), QItemSelectionModel.SelectionFlag.Deselect)
-                self.glyphListView.selectionModel().select(self.glyphListView.model().index(max(selectedIndices[0].row() - 1, 0)), QItemSelectionModel.SelectionFlag.Select)
+            row = selectedIndices[0].row()
+            self._glyphModel.removeGlyph(row)
+            self._selectGlyphRow(max(row - 1, 0))
         elif self.textListView.hasFocus():
             selectedIndices = self.textListView.selectionModel().selection().indexes()
 
             if len(selectedIndices) == 0:
                 return
 
-            del self._text._lines[selectedIndices[0].row()]
-
-            self.updateTextTable()
+            row = selectedIndices[0].row()
+            self._textModel.removeLine(row)
 
             if self._text.lineCount() > 0:
-                self.textListView.selectionModel().select(self.textListView.model().index(0), QItemSelectionModel.SelectionFlag.Deselect)
-                self.textListView.selectionModel().select(self.textListView.model().index(max(selectedIndices[0].row() - 1, 0)), QItemSelectionModel.SelectionFlag.Select)
-
-    def _fontId(self, shaderFileName) -> None:
-        return basename(shaderFileName).replace(' ', '_').replace('.', '_')
-
-    def _alignWidth(self, numberString: str) -> str:
-        return ' '*(11-len(numberString)) + numberString
+                self.textListView.selectionModel().select(self._textModel.index(max(row - 1, 0)), QItemSelectionModel.SelectionFlag.ClearAndSelect)
 
     def exportFont(self) -> None:
         (shaderFileName, _) = QFileDialog.getSaveFileName(
@@ -165,234 +380,83 @@ class FontEditor(QMainWindow):
         if shaderFileName == "":
             return
 
-        with open(shaderFileName, "wt") as f:
-            f.write('''// Generated by the ALDI Pixel Font Editor (c) 2022 Alexander Kraus <nr4@z10.info>.
-// Find a convenient font and text database editor at: https://github.com/LeStahL/aldi-pixel-font.
-uint {uniqueFontId}[{glyphCount}] = uint[{glyphCount}](
-    {dataLines}
-);
-
-uint {uniqueFontId}_text_offsets[{textCount}] = uint[{textCount}](
-    {textOffsetLines}
-);
-
-uint {uniqueFontId}_text_strings[{textDataSize}] = uint[{textDataSize}](
-    {textDataLines}
-);
-
-float d{uniqueFontId}(vec2 uv, uint ordinal, float pixelSize) {{
-    vec2 xij = (uv - mod(uv, pixelSize) + .5*pixelSize)/pixelSize;
-    return !(any(lessThan(xij, vec2(0))) || any(greaterThanEqual(xij, vec2({width},{height})))) && bool(({uniqueFontId}[ordinal - {firstOrdinal}u] >> ({width}u * (uint(xij.y) + 1u) + 1u - uint(xij.x))) & 1u) ? -1. : 1.;
-}}
-
-uint decode_single(uint byteIndex, uint data) {{
-    return (data >> (8u * byteIndex)) & 0xffu;
-}}
-
-uvec2 localIndices(uint globalByteIndex) {{
-    uint localByteIndex = globalByteIndex % 4u,
-        globalIntegerIndex = (globalByteIndex - localByteIndex) / 4u;
-    return uvec2(globalIntegerIndex, localByteIndex);
-}}
-
-float d{uniqueFontId}_text(vec2 uv, uint index, float pixelSize) {{
-    float glyphSize = {widthPlusOne}.*pixelSize,
-        x = mod(uv.x, glyphSize),
-        xi = (uv.x - x)/glyphSize;
-       
-    uvec2 localTextIndices = localIndices({uniqueFontId}_text_offsets[index]);
-    uint textSize = decode_single(localTextIndices.y, {uniqueFontId}_text_strings[localTextIndices.x]);
-    localTextIndices = localIndices({uniqueFontId}_text_offsets[index] + uint(xi) + 1u);
-    return (xi < 0. || xi >= float(textSize) || abs(uv.y-.5*{height}.*pixelSize) > {height}.*pixelSize) ? 1. : d{uniqueFontId}(vec2(x, uv.y), decode_single(localTextIndices.y, {uniqueFontId}_text_strings[localTextIndices.x]), pixelSize);
-}}
-
-uint log10(uint v) {{
-    return v < 10u ? 1u
-        : v < 100u ? 2u
-        : v < 1000u ? 3u
-        : v < 10000u ? 4u
-        : v < 100000u ? 5u
-        : v < 1000000u ? 6u
-        : v < 10000000u ? 7u
-        : v < 100000000u ? 8u
-        : 9u;
-}}
-
-uint pow10(uint v) {{
-    return v == 0u ? 1u
-        : v == 1u ? 10u
-        : v == 2u ? 100u
-        : v == 3u ? 1000u
-        : v == 4u ? 10000u
-        : v == 5u ? 100000u
-        : v == 6u ? 1000000u
-        : v == 7u ? 10000000u
-        : v == 8u ? 100000000u
-        : 1000000000u;
-}}
-
-float d{uniqueFontId}_uint(vec2 uv, uint number, float pixelSize) {{
-    uint numberWidth = max(log10(number), 1u);
-
-    float glyphSize = {widthPlusOne}. * pixelSize,
-        x = mod(uv.x, glyphSize),
-        xi = (uv.x - x) / glyphSize + float(10u - numberWidth);
-
-    uint digitIndex = uint(xi),
-        digit = number / pow10(9u - digitIndex);
-        
-    return xi < 0. || xi > 9. || abs(uv.y-.5*glyphSize) > 6.*pixelSize || digitIndex < 10u - numberWidth
-        ? 1.
-        : d{uniqueFontId}(vec2(x, uv.y), 48u + digit % 10u, pixelSize);
-}}
-
-float d{uniqueFontId}_int(vec2 uv, int number, float pixelSize) {{
-    float glyphSize = {widthPlusOne}. * pixelSize,
-        x = mod(uv.x, glyphSize),
-        xi = (uv.x - x) / glyphSize;
-
-    return uint(xi) == 0u && number < 0
-        ? d{uniqueFontId}(uv, 45u, pixelSize)
-        : d{uniqueFontId}_uint(uv - vec2(glyphSize*float(number < 0),0.), uint(abs(number)), pixelSize);
-}}
-
-float d{uniqueFontId}_float(vec2 uv, float number, uint _precision, float pixelSize) {{
-    float glyphSize = {widthPlusOne}. * pixelSize,
-        x = mod(uv.x, glyphSize),
-        xi = (uv.x - x) / glyphSize;
-
-    if(int(xi) < 0) return 1.;
-
-    if(uint(xi) == 0u && number < 0.)
-        return d{uniqueFontId}(uv, 45u, pixelSize);
-
-    uv.x -= glyphSize * float(number < 0.);
-    number = abs(number);
-
-    int exponent = number == 0. ? 0 : int(floor(log(number)/log(10.)));
-
-    x = mod(uv.x, glyphSize);
-    xi = (uv.x - x) / glyphSize;
-
-    return uint(xi) == 0u
-        ? d{uniqueFontId}(vec2(x, uv.y), 48u + uint(floor(number/pow(10., float(exponent)))) % 10u, pixelSize)
-        : uint(xi) == 1u
-            ? d{uniqueFontId}(vec2(x, uv.y), 46u, pixelSize)
-            : uint(xi) < _precision + 1u
-                ? d{uniqueFontId}(vec2(x, uv.y), 48u + uint(floor(number/pow(10., float(exponent)-xi+1.))) % 10u, pixelSize)
-                : uint(xi) == _precision + 1u
-                    ? d{uniqueFontId}(vec2(x, uv.y), 69u, pixelSize)
-                    : d{uniqueFontId}_int(vec2(uv.x - float(_precision + 2u) * glyphSize, uv.y), exponent, pixelSize);
-}}
-
-void mainImage(out vec4 fragColor, vec2 fragCoord) {{
-    vec2 uv = (fragCoord-.5*iResolution.xy)/iResolution.y;
-    fragColor = vec4(1);
-    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}(uv+vec2(.5*iResolution.x/iResolution.y,0.)-7.*.01*vec2(0.,1.), 66u, .01), 0.));
-    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_text(uv+vec2(.5*iResolution.x/iResolution.y,0.), 0u, .005), 0.));
-    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_uint(uv+vec2(.5*iResolution.x/iResolution.y,0.)+7.*.01*vec2(0.,1.), uint(iFrame), .01), 0.));
-    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(d{uniqueFontId}_int(uv+vec2(.5*iResolution.x/iResolution.y,0.)+7.*.01*vec2(0.,2.), int(-iFrame), .01), 0.));
-    fragColor.rgb = mix(fragColor.rgb, vec3(0), step(dfont_frag_float(uv+vec2(.5*iResolution.x/iResolution.y,0.)+7.*.01*vec2(0.,3.), iTime, 5u, .01), 0.));
-}}
-
-'''.format(
-    uniqueFontId = self._fontId(shaderFileName),
-    glyphCount = self._font.glyphCount(),
-    dataLines = ',\n    '.join(map(
-        lambda chunk:  '/** {:4} **/ '.format(''.join(map(
-            lambda glyph: chr(glyph._ordinal),
-            chunk,
-        ))) + ', '.join(map(
-            lambda glyph: self._alignWidth('{}u'.format(glyph.toUnsignedInt())),
-            chunk,
-        )),
-        self._font.chunks(4),
-    )),
-    width = Glyph.Width,
-    widthPlusOne = Glyph.Width + 1,
-    height = Glyph.Height,
-    firstOrdinal = self._font.ordinals()[0],
-    textCount = self._text.lineCount(),
-    textOffsetLines = ',\n    '.join(map(
-        lambda chunk:  ', '.join(map(
-            lambda num: self._alignWidth('{}u'.format(num)),
-            chunk,
-        )),
-        self._text.offsetChunks(4),
-    )),
-    textDataSize = len(self._text.toUnsignedIntegerArray()),
-    textDataLines = ',\n    '.join(map(
-        lambda chunk:  '/** {:16} **/ '.format(''.join(map(
-            lambda num: ''.join(map(chr, Text.BinaryDecodeFormat.parse(Text.BinaryExportFormat.build([num])))),
-            chunk,
-        ))).replace('\n', ' ').replace('\t', ' ').replace('\r', ' ').replace('\0', ' ') + ', '.join(map(
-            lambda num: self._alignWidth('{}u'.format(num)),
-            chunk,
-        )),
-        self._text.chunks(4),
-    )),
-))
-            f.close()
+        with instrument.span('exportFont.snapshot'):
+            task = Task(exportShader, self._font.copy(), self._text.copy(), shaderFileName)
+        self._runTask("Exporting " + basename(shaderFileName), task)
+
+    def exportUsedGlyphs(self) -> None:
+        (shaderFileName, _) = QFileDialog.getSaveFileName(
+            self,
+            "Export Used Glyphs GLSL...",
+            "font",
+            "Fragment shaders (*.frag)",
+        )
+
+        if shaderFileName == "":
+            return
+
+        self._runTask(
+            "Exporting " + basename(shaderFileName),
+            Task(exportSubsetShader, self._font.copy(), self._text.copy(), shaderFileName),
+            lambda saved: self.statusBar().showMessage("Exported the used glyphs, saved {} bytes.".format(saved)),
+        )
 
     def addLine(self):
         if self.newTextEdit.text() != "":
-            self._text.add(self.newTextEdit.text())
+            if self._textModel.addLine(self.newTextEdit.text()) < 0:
+                self.statusBar().showMessage("Lines must be ASCII and at most {} characters long.".format(TextListModel.MaximumLineLength))
+                return
             self.newTextEdit.setText("")
 
-        self.updateTextTable(scroll_down=True)
+        self._textModel.fetchUpTo(self._text.lineCount() - 1)
+        self.textListView.scrollTo(self._textModel.index(self._text.lineCount() - 1))
 
-    def updateTextTable(self, scroll_down=False):
-        newModel = QStringListModel(self._text._lines)
-        newModel.dataChanged.connect(self._textTableChanged)
-        self.textListView.setModel(newModel)
-        self.textListView.selectionModel().currentChanged.connect(self.sentenceSelected)
-        if scroll_down:
-            self.textListView.scrollTo(newModel.index(len(self._text._lines) - 1))
-
-    def _textTableChanged(self,
-        topLeft: QModelIndex,
-        bottomRight: QModelIndex,
-        roles: List[int] = [Qt.ItemDataRole.EditRole],
-    ) -> None:
-        self._text._lines[topLeft.row()] = topLeft.model().data(topLeft, Qt.ItemDataRole.EditRole)
+    def updateTextTable(self):
+        self._textModel.setText(self._text)
 
     def saveTextAs(self):
         (textFileName, _) = QFileDialog.getSaveFileName(
             self,
             "Export Text Table...",
             "table",
-            "ALDI Text Tables (*.att)",
+            "ALDI Text Tables (*.att);;ALDI Pixel Font Containers (*.apfc)",
         )
 
         if textFileName == "":
             return
 
-        with open(textFileName, "wb") as f:
-            f.write(self._text.toBytes())
-            f.close()
+        self._runTask("Saving " + basename(textFileName), Task(saveText, textFileName, self._text.copy()))
 
     def loadText(self):
         (textFileName, _) = QFileDialog.getOpenFileName(
             self,
             "Export Text Table...",
             "table",
-            "ALDI Text Tables (*.att)",
+            "ALDI Text Tables (*.att);;ALDI Pixel Font Containers (*.apfc)",
         )
 
         if textFileName == "":
             return
 
-        with open(textFileName, "rb") as f:
-            self._text.fromBytes(f.read())
-            f.close()
+        self._runTask("Loading " + basename(textFileName), Task(openText, textFileName), self._textOpened)
 
+    def _textOpened(self,
+        text: Text,
+    ) -> None:
+        release(self._text)
+        self._text = text
         self.updateTextTable()
 
     def sentenceSelected(self, current, previous, **kwargs):
-        sentence = current.model().data(current)
+        # Removing the last line leaves no current row.
+        if not current.isValid():
+            self.listSelectedLabel.setText("")
+            return
+        sentence = self._textModel.data(current)
+        size = self._textModel.data(current, TextListModel.PackedSizeRole)
         row = current.row()
-        total = current.model().rowCount()
-        self.listSelectedLabel.setText(f"Selected #{row}: {sentence} (n={total})")
+        total = self._text.lineCount()
+        self.listSelectedLabel.setText(f"Selected #{row}: {sentence} ({size} bytes, n={total})")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,228 @@
+import numpy
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from os import listdir, makedirs
+from os.path import basename, isdir, join, splitext
+from typing import Iterable, List, Optional, Tuple
+from PyQt6.QtGui import QImage
+from glyph import Glyph, GlyphShape
+from font import Font
+from atlas import FontAtlas
+
+# Builds fonts from sprite-sheet atlases (any image QImage reads, e.g. PNG
+# and PPM) and BDF bitmap fonts, e.g.
+#
+#   python fontimport.py sheet.png -o font.apf --glyph 5x6 --cell 6x7
+#   python fontimport.py fonts/ -o converted/
+#
+# Atlas cells are read left to right, top to bottom, starting at
+# `firstOrdinal`; a pixel is on when it is darker than the threshold.
+
+BdfExtension = '.bdf'
+ImageExtensions = ('.png', '.ppm', '.pgm', '.pbm', '.bmp', '.gif')
+
+def readImage(fileName: str) -> numpy.ndarray:
+    image = QImage(fileName)
+    if image.isNull():
+        raise ValueError('Cannot read image {}.'.format(fileName))
+
+    gray = image.convertToFormat(QImage.Format.Format_Grayscale8)
+    pixels = numpy.frombuffer(gray.constBits().asstring(gray.sizeInBytes()), dtype=numpy.uint8)
+    pixels = pixels.reshape(gray.height(), gray.bytesPerLine())[:, :gray.width()]
+
+    # Transparent pixels count as background, whatever their color.
+    if image.hasAlphaChannel():
+        alpha = image.convertToFormat(QImage.Format.Format_Alpha8)
+        opacity = numpy.frombuffer(alpha.constBits().asstring(alpha.sizeInBytes()), dtype=numpy.uint8)
+        opacity = opacity.reshape(alpha.height(), alpha.bytesPerLine())[:, :alpha.width()]
+        pixels = numpy.where(opacity < 0x80, 0xff, pixels)
+    return numpy.ascontiguousarray(pixels)
+
+def sliceAtlas(
+    pixels: numpy.ndarray,
+    shape: GlyphShape,
+    cellWidth: int,
+    cellHeight: int,
+    threshold: int = 0x80,
+    invert: bool = False,
+) -> numpy.ndarray:
+    # One (glyph, y, x) bit cube for all full cells, keeping the top left
+    # `shape` pixels of every cell.
+    if cellWidth < shape.width or cellHeight < shape.height:
+        raise ValueError('{}x{} cells cannot hold {} glyphs.'.format(cellWidth, cellHeight, shape))
+
+    rows = pixels.shape[0] // cellHeight
+    columns = pixels.shape[1] // cellWidth
+    bits = (pixels[:rows * cellHeight, :columns * cellWidth] < threshold) != invert
+    cells = bits.reshape(rows, cellHeight, columns, cellWidth).transpose(0, 2, 1, 3)
+    return cells[:, :, :shape.height, :shape.width].reshape(-1, shape.height, shape.width)
+
+def fontFromCube(
+    cube: numpy.ndarray,
+    ordinals: Iterable[int],
+    skipEmpty: bool = False,
+) -> Font:
+    ordinals = numpy.fromiter(ordinals, dtype=numpy.int64)[:len(cube)]
+    cube = cube[:len(ordinals)]
+
+    # .apf records store the ordinal in one byte.
+    keep = ordinals <= 0xff
+    if skipEmpty:
+        keep &= cube.any(axis=(1, 2))
+    if not keep.any():
+        return Font([], GlyphShape(cube.shape[2], cube.shape[1]))
+    return FontAtlas.fromCube(ordinals[keep], cube[keep]).toFont()
+
+def importAtlas(
+    fileName: str,
+    shape: GlyphShape = Glyph.DefaultShape,
+    cell: Optional[Tuple[int, int]] = None,
+    firstOrdinal: int = 32,
+    threshold: int = 0x80,
+    invert: bool = False,
+    skipEmpty: bool = False,
+) -> Font:
+    cellWidth, cellHeight = cell if cell is not None else (shape.width, shape.height)
+    cube = sliceAtlas(readImage(fileName), shape, cellWidth, cellHeight, threshold, invert)
+    return fontFromCube(cube, range(firstOrdinal, firstOrdinal + len(cube)), skipEmpty)
+
+def importBdf(
+    fileName: str,
+    firstOrdinal: int = 32,
+    lastOrdinal: int = 126,
+    skipEmpty: bool = False,
+) -> Font:
+    # Every glyph is placed on the font bounding box, aligned at the
+    # baseline, so all of them share its shape.
+    with open(fileName, 'rt', encoding='latin-1') as f:
+        lines = f.read().splitlines()
+
+    box = None
+    glyphs = []
+    index = 0
+    while index < len(lines):
+        fields = lines[index].split()
+        index += 1
+        if not fields:
+            continue
+        if fields[0] == 'FONTBOUNDINGBOX':
+            box = tuple(map(int, fields[1:5]))
+        elif fields[0] == 'STARTCHAR':
+            encoding, glyphBox = -1, None
+            while index < len(lines) and not lines[index].startswith('BITMAP'):
+                fields = lines[index].split()
+                if fields and fields[0] == 'ENCODING':
+                    encoding = int(fields[1])
+                elif fields and fields[0] == 'BBX':
+                    glyphBox = tuple(map(int, fields[1:5]))
+                index += 1
+            end = index + 1
+            while end < len(lines) and not lines[end].startswith('ENDCHAR'):
+                end += 1
+            if firstOrdinal <= encoding <= lastOrdinal and glyphBox is not None:
+                glyphs.append((encoding, glyphBox, ''.join(lines[index + 1:end])))
+            index = end + 1
+
+    if box is None:
+        raise ValueError('{} has no FONTBOUNDINGBOX.'.format(fileName))
+
+    width, height, left, bottom = box
+    cube = numpy.zeros((len(glyphs), height, width), dtype=bool)
+    for glyphIndex, (encoding, (glyphWidth, glyphHeight, glyphLeft, glyphBottom), bitmap) in enumerate(glyphs):
+        if glyphWidth == 0 or glyphHeight == 0:
+            continue
+        rowBytes = (glyphWidth + 7) // 8
+        bits = numpy.unpackbits(numpy.frombuffer(bytes.fromhex(bitmap), dtype=numpy.uint8)).astype(bool)
+        bits = bits.reshape(glyphHeight, rowBytes * 8)[:, :glyphWidth]
+
+        x = glyphLeft - left
+        y = height + bottom - glyphBottom - glyphHeight
+        target = cube[glyphIndex, max(y, 0):y + glyphHeight, max(x, 0):x + glyphWidth]
+        target |= bits[max(-y, 0):max(-y, 0) + target.shape[0], max(-x, 0):max(-x, 0) + target.shape[1]]
+
+    return fontFromCube(cube, (encoding for encoding, *_ in glyphs), skipEmpty)
+
+def importFont(
+    fileName: str,
+    **options,
+) -> Font:
+    if splitext(fileName)[1].lower() == BdfExtension:
+        return importBdf(fileName, **{key: value for key, value in options.items() if key in ('firstOrdinal', 'lastOrdinal', 'skipEmpty')})
+
+    options.pop('lastOrdinal', None)
+    return importAtlas(fileName, **options)
+
+def isImportable(fileName: str) -> bool:
+    return splitext(fileName)[1].lower() in ImageExtensions + (BdfExtension,)
+
+def _convert(job: Tuple[str, str, dict]) -> Optional[str]:
+    source, destination, options = job
+    try:
+        data = importFont(source, **options).toBytes()
+        with open(destination, 'wb') as f:
+            f.write(data)
+    except Exception as error:
+        return str(error)
+    return None
+
+def importDirectory(
+    directory: str,
+    outputDirectory: str,
+    processes: Optional[int] = None,
+    **options,
+) -> List[Tuple[str, Optional[str]]]:
+    # Converts every importable file to an .apf in `outputDirectory` on a
+    # process pool. Returns (source, error or None) in file name order.
+    makedirs(outputDirectory, exist_ok=True)
+    sources = sorted(join(directory, fileName) for fileName in listdir(directory) if isImportable(fileName))
+    jobs = [
+        (source, join(outputDirectory, splitext(basename(source))[0] + '.apf'), options)
+        for source in sources
+    ]
+
+    with ProcessPoolExecutor(processes) as executor:
+        return list(zip(sources, executor.map(_convert, jobs)))
+
+def parseSize(size: str) -> Tuple[int, int]:
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = ArgumentParser(description='Import ALDI pixel fonts from sprite-sheet atlases and BDF fonts.')
+    parser.add_argument('source', help='Image or .bdf file, or a directory of them.')
+    parser.add_argument('-o', '--output', help='Output .apf file or directory; defaults to the source name with an .apf extension.')
+    parser.add_argument('--glyph', type=parseSize, default=(Glyph.Width, Glyph.Height), help='Glyph size in an atlas, e.g. 5x6.')
+    parser.add_argument('--cell', type=parseSize, help='Atlas cell size including spacing; defaults to the glyph size.')
+    parser.add_argument('--first', type=int, default=32, help='Ordinal of the first atlas cell, or the first BDF encoding to import.')
+    parser.add_argument('--last', type=int, default=126, help='Last BDF encoding to import.')
+    parser.add_argument('--threshold', type=int, default=0x80, help='Gray value below which an atlas pixel is on.')
+    parser.add_argument('--invert', action='store_true', help='Treat bright atlas pixels as on.')
+    parser.add_argument('--skip-empty', action='store_true', help='Drop glyphs without any pixel set.')
+    parser.add_argument('--processes', type=int, help='Worker processes for directory imports.')
+    args = parser.parse_args(arguments)
+
+    options = {
+        'shape': GlyphShape(*args.glyph),
+        'cell': args.cell,
+        'firstOrdinal': args.first,
+        'lastOrdinal': args.last,
+        'threshold': args.threshold,
+        'invert': args.invert,
+        'skipEmpty': args.skip_empty,
+    }
+
+    if isdir(args.source):
+        failed = 0
+        for source, error in importDirectory(args.source, args.output or args.source, args.processes, **options):
+            if error is not None:
+                print('{}: {}'.format(source, error))
+                failed += 1
+        return 1 if failed else 0
+
+    font = importFont(args.source, **options)
+    with open(args.output or splitext(args.source)[0] + '.apf', 'wb') as f:
+        f.write(font.toBytes())
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,153 @@
+from PyQt6.QtCore import *
+from PyQt6.QtGui import *
+from PyQt6.QtWidgets import *
+from typing import Dict, List, Optional, Set, Tuple
+import numpy
+from font import Font
+from text import Text
+from atlas import FontAtlas
+
+class FontPreview(QWidget):
+    Columns = 16
+    SampleCount = 8
+
+    def __init__(self,
+        font: Optional[Font] = None,
+        text: Optional[Text] = None,
+        parent: Optional[QWidget] = None,
+    ) -> None:
+        super().__init__(parent)
+
+        self._font = font if font is not None else Font([])
+        self._text = text if text is not None else Text()
+        self._atlas = QImage()
+        self._tiles: Dict[int, int] = {}
+        self._samples: List[QImage] = []
+        self._samplesUsing: Dict[int, Set[int]] = {}
+
+        self.setPixelFont(self._font)
+
+    def setPixelFont(self,
+        font: Font,
+    ) -> None:
+        self._font = font
+        self.pixelFontChanged()
+
+    def setText(self,
+        text: Text,
+    ) -> None:
+        self._text = text
+        self.textChanged()
+
+    def pixelFontChanged(self) -> None:
+        # Full rebuild for structural changes (new font, added, removed or
+        # renamed glyphs), done in one go through the NumPy atlas.
+        shape = self._font.shape()
+        self._tileWidth = shape.width + 1
+        self._tileHeight = shape.height + 1
+        self.setMinimumHeight(4 * self._tileHeight)
+        ordinals = self._font.ordinals()
+        self._tiles = {ordinal: index for index, ordinal in enumerate(ordinals)}
+
+        rows = max((len(ordinals) + FontPreview.Columns - 1) // FontPreview.Columns, 1)
+        cube = FontAtlas.fromFont(self._font).cube()
+        cube = numpy.pad(cube, ((0, rows * FontPreview.Columns - len(ordinals)), (0, 1), (0, 1)))
+        grid = cube.reshape(rows, FontPreview.Columns, self._tileHeight, self._tileWidth)
+        grid = grid.transpose(0, 2, 1, 3).reshape(rows * self._tileHeight, FontPreview.Columns * self._tileWidth)
+        pixels = numpy.ascontiguousarray(numpy.where(grid, 0, 255).astype(numpy.uint8))
+
+        self._atlas = QImage(
+            pixels.data,
+            pixels.shape[1],
+            pixels.shape[0],
+            pixels.shape[1],
+            QImage.Format.Format_Grayscale8,
+        ).copy()
+        self.textChanged()
+
+    def textChanged(self) -> None:
+        self._samples = []
+        self._samplesUsing = {}
+        for index in range(min(self._text.lineCount(), FontPreview.SampleCount)):
+            line = self._text.line(index)
+            for character in set(line):
+                self._samplesUsing.setdefault(ord(character), set()).add(index)
+            self._samples.append(self._layoutSample(line))
+        self.update()
+
+    def glyphChanged(self,
+        ordinal: int,
+    ) -> None:
+        # A pixel edit redraws one atlas tile and re-lays out only the
+        # sample strings that contain the glyph.
+        tile = self._tiles.get(ordinal)
+        glyph = self._font.glyphWithOrdinal(ordinal)
+        if tile is None or glyph is None:
+            return
+
+        left, top = self._tileOrigin(tile)
+        black = QColor(Qt.GlobalColor.black).rgb()
+        white = QColor(Qt.GlobalColor.white).rgb()
+        for y in range(glyph.height()):
+            for x in range(glyph.width()):
+                self._atlas.setPixel(left + x, top + y, black if glyph.isOn(x, y) else white)
+
+        for index in self._samplesUsing.get(ordinal, ()):
+            self._samples[index] = self._layoutSample(self._text.line(index))
+        self.update()
+
+    def _tileOrigin(self,
+        tile: int,
+    ) -> Tuple[int, int]:
+        return (
+            (tile % FontPreview.Columns) * self._tileWidth,
+            (tile // FontPreview.Columns) * self._tileHeight,
+        )
+
+    def _layoutSample(self,
+        line: str,
+    ) -> QImage:
+        image = QImage(max(len(line), 1) * self._tileWidth, self._tileHeight, QImage.Format.Format_Grayscale8)
+        image.fill(Qt.GlobalColor.white)
+
+        painter = QPainter(image)
+        for column, character in enumerate(line):
+            tile = self._tiles.get(ord(character))
+            if tile is not None:
+                left, top = self._tileOrigin(tile)
+                painter.drawImage(
+                    column * self._tileWidth,
+                    0,
+                    self._atlas,
+                    left,
+                    top,
+                    self._tileWidth,
+                    self._tileHeight,
+                )
+        painter.end()
+        return image
+
+    def _scale(self) -> int:
+        return max(self.width() // max(self._atlas.width(), 1), 1)
+
+    def sizeHint(self) -> QSize:
+        scale = 2
+        height = self._atlas.height() + len(self._samples) * self._tileHeight
+        return QSize(self._atlas.width() * scale, height * scale)
+
+    def paintEvent(self,
+        event: QPaintEvent,
+    ) -> None:
+        super().paintEvent(event)
+
+        painter = QPainter(self)
+        painter.fillRect(event.rect(), Qt.GlobalColor.white)
+
+        scale = self._scale()
+        painter.drawImage(QRect(0, 0, self._atlas.width() * scale, self._atlas.height() * scale), self._atlas)
+
+        top = (self._atlas.height() + self._tileHeight) * scale
+        for sample in self._samples:
+            painter.drawImage(QRect(0, top, sample.width() * scale, sample.height() * scale), sample)
+            top += sample.height() * scale
+        painter.end()
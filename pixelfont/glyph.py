@@ -1,10 +1,56 @@
 from typing import Optional, List
 import construct
+import instrument
+
+class GlyphShape:
+    # Glyph dimensions of one font. The pixels are packed MSB-first into a
+    # word of whole bytes; pixel (x, y) lives at bit
+    # `wordBits - 1 - (y * width + x)` and the low bits are zero padding.
+    __slots__ = ('width', 'height', 'pixelCount', 'wordBits', 'wordBytes', 'wordMask', 'recordSize')
+
+    def __init__(self,
+        width: int,
+        height: int,
+    ) -> None:
+        if not (0 < width <= 0xff and 0 < height <= 0xff):
+            raise ValueError('Glyph dimensions must be 1 to 255 pixels, got {}x{}.'.format(width, height))
+
+        self.width = width
+        self.height = height
+        self.pixelCount = width * height
+        self.wordBits = (self.pixelCount + 7) // 8 * 8
+        self.wordBytes = self.wordBits // 8
+        self.wordMask = ((1 << self.pixelCount) - 1) << (self.wordBits - self.pixelCount)
+        self.recordSize = 1 + self.wordBytes
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, GlyphShape) and (self.width, self.height) == (other.width, other.height)
+
+    def __hash__(self) -> int:
+        return hash((self.width, self.height))
+
+    def __repr__(self) -> str:
+        return 'GlyphShape({}, {})'.format(self.width, self.height)
 
 class Glyph:
+    __slots__ = ('_ordinal', '_word', '_shape')
+
     Width = 5
     Height = 6
 
+    # Pixel (x, y) lives at bit `WordBits - 1 - (y * Width + x)` of the packed
+    # word; this is the MSB-first layout of `BinaryFormat` including its
+    # zero padding bits, so `toUnsignedInt` needs no conversion at all.
+    PixelCount = Width * Height
+    WordBits = (PixelCount + 7) // 8 * 8
+    WordBytes = WordBits // 8
+    WordMask = ((1 << PixelCount) - 1) << (WordBits - PixelCount)
+    RecordSize = 1 + WordBytes
+
+    # The constants above describe the original 5x6 glyphs, which stay the
+    # default; glyphs of other fonts carry their font's shape.
+    DefaultShape = GlyphShape(Width, Height)
+
     BinaryFormat = construct.Bitwise(construct.Aligned(
         8,
         construct.Array(
@@ -21,9 +67,50 @@ class Glyph:
     def __init__(self,
         ordinal: int = 0,
         pixels: Optional[List[bool]] = None,
+        shape: GlyphShape = DefaultShape,
     ):
-        self._pixels = pixels if pixels is not None else [False] * Glyph.Width * Glyph.Height
         self._ordinal = ordinal
+        self._shape = shape
+        self._word = Glyph.packPixels(pixels, shape) if pixels is not None else 0
+
+    @staticmethod
+    def withWord(
+        ordinal: int,
+        word: int,
+        shape: GlyphShape = DefaultShape,
+    ) -> 'Glyph':
+        glyph = Glyph(ordinal, shape=shape)
+        glyph._word = word & shape.wordMask
+        return glyph
+
+    @staticmethod
+    def packPixels(
+        pixels: List[bool],
+        shape: GlyphShape = DefaultShape,
+    ) -> int:
+        word = 0
+        for pixel in pixels:
+            word = (word << 1) | bool(pixel)
+        return word << (shape.wordBits - len(pixels))
+
+    @staticmethod
+    def unpackPixels(
+        word: int,
+        shape: GlyphShape = DefaultShape,
+    ) -> List[bool]:
+        return [
+            bool((word >> (shape.wordBits - 1 - index)) & 1)
+            for index in range(shape.pixelCount)
+        ]
+
+    def shape(self) -> GlyphShape:
+        return self._shape
+
+    def width(self) -> int:
+        return self._shape.width
+
+    def height(self) -> int:
+        return self._shape.height
 
     def toggle(self,
         x: int,
@@ -33,60 +120,83 @@ class Glyph:
         if not self.isValidPixelCoordinate(x, y):
             return False
 
-        self._pixels[y * Glyph.Width + x] = on if on is not None else not self._pixels[y * Glyph.Width + x]
-        
+        bit = 1 << (self._shape.wordBits - 1 - (y * self._shape.width + x))
+        if on is None:
+            self._word ^= bit
+        elif on:
+            self._word |= bit
+        else:
+            self._word &= ~bit
+
         return True
 
+    def pixels(self) -> List[bool]:
+        return Glyph.unpackPixels(self._word, self._shape)
+
     def toBytes(self) -> bytes:
-        return Glyph.BinarySaveFormat.build(self.toObject())
+        return bytes((self._ordinal,)) + self._word.to_bytes(self._shape.wordBytes, 'big')
 
     def toObject(self) -> object:
         return {
             'ordinal': self._ordinal,
-            'pixels': self._pixels,
+            'pixels': self.pixels(),
         }
 
     def fromBytes(self,
         data: bytes,
     ) -> None:
-        parsed = Glyph.BinarySaveFormat.parse(data)
-        self._pixels = parsed['pixels']
-        self._ordinal = parsed['ordinal']
+        if len(data) < self._shape.recordSize:
+            raise ValueError('Glyph record needs {} bytes, got {}.'.format(self._shape.recordSize, len(data)))
+
+        self._ordinal = data[0]
+        self._word = int.from_bytes(data[1:self._shape.recordSize], 'big') & self._shape.wordMask
 
     def toUnsignedInt(self) -> int:
-        return int.from_bytes(
-            Glyph.BinaryFormat.build(self._pixels),
-            'big',
-            signed=False,
-        )
+        return self._word
 
     def fromUnsignedInt(self,
         data: int,
     ) -> None:
-        self._pixels = Glyph.BinaryFormat.parse(data.to_bytes('big', signed=False))
+        self._word = data & self._shape.wordMask
 
     def isOn(self,
         x: int,
         y: int,
     ) -> Optional[bool]:
         if self.isValidPixelCoordinate(x, y):
-            return self._pixels[y * Glyph.Width + x]
+            return bool((self._word >> (self._shape.wordBits - 1 - (y * self._shape.width + x))) & 1)
         return None
 
     def isValidPixelCoordinate(self,
         x: int,
         y: int,
     ) -> bool:
-        return x >= 0 and x < Glyph.Width and y >= 0 and y < Glyph.Height
+        return x >= 0 and x < self._shape.width and y >= 0 and y < self._shape.height
+
+instrument.register(Glyph, 'toUnsignedInt')
 
 if __name__ == '__main__':
     glyph = Glyph(ord('a'))
     glyph.toggle(1, 1, True)
 
     serialized = glyph.toBytes()
+    assert serialized == Glyph.BinarySaveFormat.build(glyph.toObject())
+    assert glyph.toUnsignedInt() == int.from_bytes(Glyph.BinaryFormat.build(glyph.pixels()), 'big')
 
     glyph = Glyph()
 
     glyph.fromBytes(serialized)
 
     assert glyph.isOn(1, 1)
+    assert not glyph.isOn(0, 1)
+
+    copy = Glyph()
+    copy.fromUnsignedInt(glyph.toUnsignedInt())
+    assert copy.pixels() == glyph.pixels()
+
+    shape = GlyphShape(8, 8)
+    glyph = Glyph(ord('a'), shape=shape)
+    glyph.toggle(7, 7, True)
+    assert glyph.toUnsignedInt() == 1 and glyph.isOn(7, 7)
+    assert Glyph.packPixels(glyph.pixels(), shape) == glyph.toUnsignedInt()
+    assert len(glyph.toBytes()) == shape.recordSize == 9
@@ -4,9 +4,16 @@ from PyQt6.QtWidgets import *
 from PyQt6 import uic
 from typing import Optional
 from glyph import *
+import instrument
 from sys import argv
 
 class GlyphEditor(QWidget):
+    glyphChanged = pyqtSignal(int)
+    glyphStroked = pyqtSignal(int, int)
+
+    OnBrush = QBrush(QColor(Qt.GlobalColor.black))
+    OffBrush = QBrush(QColor(Qt.GlobalColor.white))
+
     def __init__(self,
         glyph: Optional[Glyph] = Glyph(),
         parent: Optional[QWidget] = None,
@@ -17,47 +24,90 @@ class GlyphEditor(QWidget):
         self._glyph = glyph
         self._holding = False
         self._lastResult = True
+        self._strokeCells = set()
+        self._strokeMask = 0
+        self._gridPixmap = None
+        self._gridShape = None
+
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)
+        self.resize(glyph.width() * 50, glyph.height() * 50)
 
-        self.resize(Glyph.Width * 50, Glyph.Height * 50)
+    def _cellSize(self) -> QSize:
+        return QSize(
+            int(self.rect().width() / self._glyph.width()),
+            int(self.rect().height() / self._glyph.height()),
+        )
+
+    def _cellRect(self,
+        x: int,
+        y: int,
+    ) -> QRect:
+        size = self._cellSize()
+        return QRect(x * size.width(), y * size.height(), size.width() + 1, size.height() + 1)
+
+    def _cellAt(self,
+        pos: QPoint,
+    ) -> tuple:
+        size = self._cellSize()
+        return (int(pos.x() / max(size.width(), 1)), int(pos.y() / max(size.height(), 1)))
+
+    def _updateGridPixmap(self) -> None:
+        # The grid lines only depend on the widget size and the glyph shape,
+        # so they are drawn once per change and blitted over the cells on
+        # every paint. The shape is remembered, as `Font.setShape` resizes
+        # the displayed glyph in place.
+        self._gridShape = self._glyph.shape()
+        self._gridPixmap = QPixmap(self.size())
+        self._gridPixmap.fill(Qt.GlobalColor.transparent)
+
+        size = self._cellSize()
+        painter = QPainter(self._gridPixmap)
+        for x in range(self._glyph.width()):
+            painter.drawLine(x * size.width(), 0, x * size.width(), self.rect().height())
+        for y in range(self._glyph.height()):
+            painter.drawLine(0, y * size.height(), self.rect().width(), y * size.height())
+        painter.end()
+
+    def resizeEvent(self,
+        event: QResizeEvent,
+    ) -> None:
+        super().resizeEvent(event)
+
+        self._gridPixmap = None
 
     def paintEvent(self,
         event: QPaintEvent,
     ) -> None:
         super().paintEvent(event)
-    
-        painter = QPainter(self)
-        painter.save()
 
-        dx = int(self.rect().width() / Glyph.Width)
-        dy = int(self.rect().height() / Glyph.Height)
+        if self._gridPixmap is None or self._gridShape != self._glyph.shape():
+            self._updateGridPixmap()
+
+        painter = QPainter(self)
+        dirty = event.rect()
+        painter.fillRect(dirty, self.palette().window())
 
-        for x in range(Glyph.Width):
-            for y in range(Glyph.Height):
-                on = self._glyph.isOn(x,y)
-                if on is not None:
+        size = self._cellSize()
+        if size.width() > 0 and size.height() > 0:
+            for x in range(max(dirty.left() // size.width() - 1, 0), min(dirty.right() // size.width() + 1, self._glyph.width())):
+                for y in range(max(dirty.top() // size.height() - 1, 0), min(dirty.bottom() // size.height() + 1, self._glyph.height())):
                     painter.fillRect(
-                        x * dx,
-                        y * dy,
-                        dx,
-                        dy,
-                        QBrush(QColor(Qt.GlobalColor.black if on else Qt.GlobalColor.white)),
+                        x * size.width(),
+                        y * size.height(),
+                        size.width(),
+                        size.height(),
+                        GlyphEditor.OnBrush if self._glyph.isOn(x, y) else GlyphEditor.OffBrush,
                     )
-            painter.drawLine(x * dx, 0, x * dx, self.rect().height())
-        for y in range(Glyph.Height):
-            painter.drawLine(0, y * dy, self.rect().width(), y * dy)
 
-        painter.restore()
+        painter.drawPixmap(dirty, self._gridPixmap, dirty)
+        painter.end()
 
     def mousePressEvent(self,
         event: QMouseEvent,
     ) -> None:
         super().mousePressEvent(event)
 
-        dx = int(self.rect().width() / Glyph.Width)
-        dy = int(self.rect().height() / Glyph.Height)
-
-        x = int(event.pos().x() / dx)
-        y = int(event.pos().y() / dy)
+        x, y = self._cellAt(event.pos())
 
         on = self._glyph.isOn(x,y)
         if on is None:
@@ -65,6 +115,7 @@ class GlyphEditor(QWidget):
 
         self._holding = True
         self._lastResult = not on
+        self._strokeCells = set()
 
         self.toggle(x, y)
 
@@ -73,13 +124,8 @@ class GlyphEditor(QWidget):
     ) -> None:
         super().mouseMoveEvent(event)
 
-        dx = int(self.rect().width() / Glyph.Width)
-        dy = int(self.rect().height() / Glyph.Height)
-
-        x = int(event.pos().x() / dx)
-        y = int(event.pos().y() / dy)
-
         if self._holding:
+            x, y = self._cellAt(event.pos())
             self.toggle(x, y)
 
     def mouseReleaseEvent(self,
@@ -88,23 +134,50 @@ class GlyphEditor(QWidget):
         super().mouseReleaseEvent(event)
 
         self._holding = False
-    
+        self._strokeCells = set()
+        self._finishStroke()
+
+    def _finishStroke(self) -> None:
+        # A whole stroke is reported as one XOR mask of the cells it flipped.
+        if self._strokeMask:
+            mask, self._strokeMask = self._strokeMask, 0
+            self.glyphStroked.emit(self._glyph._ordinal, mask)
+
     def toggle(self,
         x: int,
         y: int,
     ) -> bool:
+        # Every cell is set at most once per stroke, and only cells that
+        # actually change are repainted.
+        if (x, y) in self._strokeCells:
+            return False
+        self._strokeCells.add((x, y))
+
+        on = self._glyph.isOn(x, y)
+        if on is None or on == self._lastResult:
+            return False
+
+        word = self._glyph.toUnsignedInt()
         self._glyph.toggle(x, y, self._lastResult)
-        self.update()
+        self._strokeMask ^= word ^ self._glyph.toUnsignedInt()
+        self.update(self._cellRect(x, y))
+        self.glyphChanged.emit(self._glyph._ordinal)
+        if not self._holding:
+            self._finishStroke()
+        return True
     
     def setGlyph(self,
         glyph: Glyph,
     ) -> None:
+        self._finishStroke()
         self._glyph = glyph
         self.update()
 
     def glyph(self) -> Glyph:
         return self._glyph
 
+instrument.register(GlyphEditor, 'paintEvent')
+
 if __name__ == '__main__':
     app = QApplication(argv)
 
@@ -0,0 +1,147 @@
+from PyQt6.QtCore import *
+from PyQt6.QtGui import *
+from typing import Any, Dict, Optional
+from glyph import Glyph
+from font import Font
+
+class GlyphListModel(QAbstractListModel):
+    IconScale = 3
+    MaximumCachedIcons = 4096
+
+    def __init__(self,
+        font: Optional[Font] = None,
+        parent: Optional[QObject] = None,
+    ) -> None:
+        super().__init__(parent)
+
+        self._font = font if font is not None else Font([])
+        self._icons: Dict[int, QIcon] = {}
+
+    def setFont(self,
+        font: Font,
+    ) -> None:
+        self.beginResetModel()
+        self._font = font
+        self.endResetModel()
+
+    def font(self) -> Font:
+        return self._font
+
+    def rowCount(self,
+        parent: QModelIndex = QModelIndex(),
+    ) -> int:
+        if parent.isValid():
+            return 0
+        return self._font.glyphCount()
+
+    def flags(self,
+        index: QModelIndex,
+    ) -> Qt.ItemFlag:
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    def data(self,
+        index: QModelIndex,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> Any:
+        if not index.isValid() or index.row() >= self._font.glyphCount():
+            return None
+
+        ordinal = self._font.ordinalAt(index.row())
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return chr(ordinal)
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self._icon(self._font.glyphWithOrdinal(ordinal))
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return '{} (0x{:02x})'.format(ordinal, ordinal)
+        return None
+
+    def _icon(self,
+        glyph: Glyph,
+    ) -> QIcon:
+        # Previews are keyed by the packed pixels, so glyphs that look the
+        # same share one icon and an edited glyph simply gets a new key.
+        key = (glyph.shape(), glyph.toUnsignedInt())
+        icon = self._icons.get(key)
+        if icon is None:
+            if len(self._icons) >= GlyphListModel.MaximumCachedIcons:
+                self._icons.clear()
+
+            image = QImage(glyph.width(), glyph.height(), QImage.Format.Format_RGB32)
+            image.fill(Qt.GlobalColor.white)
+            black = QColor(Qt.GlobalColor.black).rgb()
+            for y in range(glyph.height()):
+                for x in range(glyph.width()):
+                    if glyph.isOn(x, y):
+                        image.setPixel(x, y, black)
+
+            icon = QIcon(QPixmap.fromImage(image.scaled(
+                glyph.width() * GlyphListModel.IconScale,
+                glyph.height() * GlyphListModel.IconScale,
+            )))
+            self._icons[key] = icon
+        return icon
+
+    def setData(self,
+        index: QModelIndex,
+        value: Any,
+        role: int = Qt.ItemDataRole.EditRole,
+    ) -> bool:
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        if not isinstance(value, str) or len(value) != 1:
+            return False
+
+        return self.renameGlyph(index.row(), ord(value))
+
+    def renameGlyph(self,
+        row: int,
+        toOrdinal: int,
+    ) -> bool:
+        fromOrdinal = self._font.ordinalAt(row)
+        if fromOrdinal == toOrdinal or self._font.hasOrdinal(toOrdinal):
+            return False
+
+        # The list stays sorted by ordinal, so a rename is a row move.
+        destination = self._font.insertionIndex(toOrdinal)
+        moves = destination not in (row, row + 1)
+        if moves:
+            self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination)
+        self._font.renameGlyph(fromOrdinal, toOrdinal)
+        if moves:
+            self.endMoveRows()
+
+        newIndex = self.index(self._font.indexOfOrdinal(toOrdinal))
+        self.dataChanged.emit(newIndex, newIndex)
+        return True
+
+    def addGlyph(self) -> int:
+        ordinal = self._font.newOrdinal()
+        if ordinal == -1:
+            return -1
+
+        row = self._font.insertionIndex(ordinal)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._font.addGlyph(Glyph(ordinal, shape=self._font.shape()))
+        self.endInsertRows()
+        return row
+
+    def removeGlyph(self,
+        row: int,
+    ) -> bool:
+        if row < 0 or row >= self._font.glyphCount():
+            return False
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._font.removeGlyph(self._font.ordinalAt(row))
+        self.endRemoveRows()
+        return True
+
+    def glyphChanged(self,
+        ordinal: int,
+    ) -> None:
+        row = self._font.indexOfOrdinal(ordinal)
+        if row != -1:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
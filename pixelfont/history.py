@@ -0,0 +1,112 @@
+from collections import deque
+from typing import Callable, Deque, Optional, Union
+
+# Undo/redo journal of compact deltas. A pixel stroke is a single XOR mask
+# over the packed glyph word, so it applies and reverts by the same
+# operation; a text edit is a line patch holding only the line before and
+# after. The journal is trimmed from the oldest end to stay in budget.
+
+class GlyphDelta:
+    __slots__ = ('ordinal', 'mask')
+
+    def __init__(self,
+        ordinal: int,
+        mask: int,
+    ) -> None:
+        self.ordinal = ordinal
+        self.mask = mask
+
+    def size(self) -> int:
+        return History.DeltaSize
+
+class LineDelta:
+    __slots__ = ('index', 'before', 'after')
+
+    def __init__(self,
+        index: int,
+        before: Optional[str],
+        after: Optional[str],
+    ) -> None:
+        # `before` is None for an inserted line, `after` for a removed one.
+        self.index = index
+        self.before = before
+        self.after = after
+
+    def size(self) -> int:
+        return History.DeltaSize + len(self.before or '') + len(self.after or '')
+
+Delta = Union[GlyphDelta, LineDelta]
+
+class History:
+    DeltaSize = 64
+    DefaultBudget = 1 << 20
+
+    def __init__(self,
+        apply: Callable[[Delta, bool], None],
+        budget: int = DefaultBudget,
+    ) -> None:
+        # `apply(delta, forward)` performs a delta on the document; deltas
+        # recorded while it runs are the journal's own and get dropped.
+        self._apply = apply
+        self._budget = budget
+        self._undo: Deque[Delta] = deque()
+        self._redo: Deque[Delta] = deque()
+        self._size = 0
+        self._applying = False
+
+    def record(self,
+        delta: Delta,
+    ) -> None:
+        if self._applying:
+            return
+
+        for step in self._redo:
+            self._size -= step.size()
+        self._redo.clear()
+
+        self._undo.append(delta)
+        self._size += delta.size()
+        while self._size > self._budget and len(self._undo) > 1:
+            self._size -= self._undo.popleft().size()
+
+    def canUndo(self) -> bool:
+        return len(self._undo) > 0
+
+    def canRedo(self) -> bool:
+        return len(self._redo) > 0
+
+    def undo(self) -> bool:
+        if not self._undo:
+            return False
+
+        delta = self._undo.pop()
+        self._run(delta, False)
+        self._redo.append(delta)
+        return True
+
+    def redo(self) -> bool:
+        if not self._redo:
+            return False
+
+        delta = self._redo.pop()
+        self._run(delta, True)
+        self._undo.append(delta)
+        return True
+
+    def clear(self) -> None:
+        self._undo.clear()
+        self._redo.clear()
+        self._size = 0
+
+    def size(self) -> int:
+        return self._size
+
+    def _run(self,
+        delta: Delta,
+        forward: bool,
+    ) -> None:
+        self._applying = True
+        try:
+            self._apply(delta, forward)
+        finally:
+            self._applying = False
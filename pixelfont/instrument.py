@@ -0,0 +1,212 @@
+import atexit
+import json
+from contextlib import nullcontext
+from functools import wraps
+from os import environ, getpid
+from sys import stderr
+from threading import get_ident
+from time import perf_counter_ns
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Opt-in call counts and cumulative times for hot paths. Modules register
+# their hot methods with `register`; only `enable` swaps in timing
+# wrappers and `disable` puts the original methods back, so a disabled
+# run executes exactly the uninstrumented code. Phases of longer
+# operations are timed with `with span(name):`, which is a shared no-op
+# context while disabled.
+#
+#   PIXELFONT_PROFILE=1            print a summary to stderr at exit
+#   PIXELFONT_PROFILE=stats.json   write the summary as JSON at exit
+#   PIXELFONT_TRACE=trace.json     also record every call and write a
+#                                  Chrome trace (chrome://tracing, Perfetto)
+#
+# Times include nested instrumented calls. Only the first `TraceLimit`
+# calls are kept in a trace.
+
+ProfileVariable = 'PIXELFONT_PROFILE'
+TraceVariable = 'PIXELFONT_TRACE'
+TraceLimit = 1 << 20
+
+_enabled = False
+_registered: List[Tuple[type, str]] = []
+_originals: Dict[Tuple[type, str], Any] = {}
+_stats: Dict[str, List[int]] = {}
+_trace: Optional[List[Tuple[str, int, int, int]]] = None
+_dropped = 0
+_origin = perf_counter_ns()
+_noSpan = nullcontext()
+
+def _record(name: str, stats: List[int], start: int, end: int) -> None:
+    global _dropped
+    stats[0] += 1
+    stats[1] += end - start
+    if _trace is not None:
+        if len(_trace) < TraceLimit:
+            _trace.append((name, start, end - start, get_ident()))
+        else:
+            _dropped += 1
+
+def _wrap(name: str, function: Callable) -> Callable:
+    stats = _stats.setdefault(name, [0, 0])
+
+    @wraps(function)
+    def wrapper(*arguments, **keywordArguments):
+        start = perf_counter_ns()
+        try:
+            return function(*arguments, **keywordArguments)
+        finally:
+            _record(name, stats, start, perf_counter_ns())
+    return wrapper
+
+def _patch(owner: type, attribute: str) -> None:
+    if (owner, attribute) in _originals:
+        return
+    original = owner.__dict__[attribute]
+    _originals[(owner, attribute)] = original
+    setattr(owner, attribute, _wrap('{}.{}'.format(owner.__name__, attribute), original))
+
+def register(
+    owner: type,
+    *attributes: str,
+) -> None:
+    for attribute in attributes:
+        _registered.append((owner, attribute))
+        if _enabled:
+            _patch(owner, attribute)
+
+def enable(
+    trace: bool = False,
+) -> None:
+    global _enabled, _trace, _origin
+    if not _enabled:
+        _origin = perf_counter_ns()
+    _enabled = True
+    if trace and _trace is None:
+        _trace = []
+    for owner, attribute in _registered:
+        _patch(owner, attribute)
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+
+def isEnabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    global _dropped, _origin
+    for stats in _stats.values():
+        stats[0] = stats[1] = 0
+    if _trace is not None:
+        _trace.clear()
+    _dropped = 0
+    _origin = perf_counter_ns()
+
+class _Span:
+    __slots__ = ('_name', '_stats', '_start')
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._stats = _stats.setdefault(name, [0, 0])
+
+    def __enter__(self) -> '_Span':
+        self._start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        _record(self._name, self._stats, self._start, perf_counter_ns())
+
+def span(name: str):
+    return _Span(name) if _enabled else _noSpan
+
+def summary() -> Dict[str, dict]:
+    return {
+        name: {'calls': calls, 'seconds': nanoseconds * 1e-9}
+        for name, (calls, nanoseconds) in sorted(_stats.items(), key=lambda item: -item[1][1])
+        if calls > 0
+    }
+
+def formatSummary() -> str:
+    lines = ['{:40} {:>10} {:>12} {:>12}'.format('', 'calls', 'total ms', 'mean us')]
+    for name, stats in summary().items():
+        lines.append('{:40} {:10} {:12.3f} {:12.3f}'.format(
+            name,
+            stats['calls'],
+            stats['seconds'] * 1e3,
+            stats['seconds'] * 1e6 / stats['calls'],
+        ))
+    if _dropped:
+        lines.append('{} calls were not traced.'.format(_dropped))
+    return '\n'.join(lines)
+
+def writeSummary(fileName: str) -> None:
+    with open(fileName, 'wt') as f:
+        json.dump(summary(), f, indent=1)
+
+def writeTrace(fileName: str) -> None:
+    # Complete ('X') events in microseconds since `enable` or `reset`.
+    pid = getpid()
+    with open(fileName, 'wt') as f:
+        json.dump({
+            'traceEvents': [
+                {
+                    'name': name,
+                    'cat': 'pixelfont',
+                    'ph': 'X',
+                    'ts': (start - _origin) / 1e3,
+                    'dur': duration / 1e3,
+                    'pid': pid,
+                    'tid': tid,
+                }
+                for name, start, duration, tid in _trace or []
+            ],
+            'displayTimeUnit': 'ms',
+        }, f)
+
+def _writeAtExit() -> None:
+    profile = environ.get(ProfileVariable, '')
+    if profile.lower().endswith('.json'):
+        writeSummary(profile)
+    elif profile:
+        print(formatSummary(), file=stderr)
+    if environ.get(TraceVariable):
+        writeTrace(environ[TraceVariable])
+
+if environ.get(ProfileVariable) or environ.get(TraceVariable):
+    enable(trace=bool(environ.get(TraceVariable)))
+    atexit.register(_writeAtExit)
+
+if __name__ == '__main__':
+    from tempfile import TemporaryDirectory
+    from os.path import join
+
+    class Example:
+        def work(self, n: int) -> int:
+            return sum(range(n))
+
+    original = Example.work
+    register(Example, 'work')
+    assert Example.work is original or isEnabled()
+
+    enable(trace=True)
+    reset()
+    for _ in range(3):
+        Example().work(1000)
+    with span('phase'):
+        Example().work(10)
+    stats = summary()
+    assert stats['Example.work']['calls'] == 4
+    assert stats['phase']['calls'] == 1
+
+    with TemporaryDirectory() as directory:
+        writeTrace(join(directory, 'trace.json'))
+        with open(join(directory, 'trace.json'), 'rt') as f:
+            assert len(json.load(f)['traceEvents']) == 5
+
+    disable()
+    assert Example.work is original
+    assert span('phase') is _noSpan
+    print(formatSummary())
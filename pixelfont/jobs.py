@@ -0,0 +1,104 @@
+import container
+from threading import Event
+from typing import Callable, Optional
+from font import Font
+from text import Text
+from export import NumberCharacters, ShaderStrategy, Strategies, fontId, subsetFont, subsetSavings, writeShader
+from fontimport import importFont
+
+# File operations that can run off the GUI thread. They are the shared
+# loaders, savers and exporters with `Job.progress` as their progress
+# hook, which reports progress and raises `Cancelled` between chunks and
+# export phases; a cancelled or failed job leaves the previous file
+# intact. Callers pass copies (`Font.copy`, `Text.copy`) so that editing
+# can go on meanwhile.
+
+class Cancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> None:
+        self._progress = progress
+        self._cancelled = Event()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def isCancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def progress(self,
+        done: int,
+        total: int,
+    ) -> None:
+        if self._cancelled.is_set():
+            raise Cancelled()
+        if self._progress is not None:
+            self._progress(done, total)
+
+def openFont(
+    fileName: str,
+    job: Job,
+) -> Font:
+    # Containers stay mapped and decode on demand; see `container.release`.
+    return container.loadFont(fileName, job.progress, lazy=True) or Font([])
+
+def importFontFile(
+    fileName: str,
+    job: Job,
+    **options,
+) -> Font:
+    # Atlas and BDF decoding is a single vectorized pass, so there is no
+    # chunk to report progress for in between.
+    job.progress(0, 1)
+    font = importFont(fileName, **options)
+    job.progress(1, 1)
+    return font
+
+def openText(
+    fileName: str,
+    job: Job,
+) -> Text:
+    return container.loadText(fileName, job.progress, lazy=True) or Text()
+
+def saveFont(
+    fileName: str,
+    font: Font,
+    text: Optional[Text],
+    job: Job,
+) -> None:
+    container.saveFont(fileName, font, text, job.progress)
+
+def saveText(
+    fileName: str,
+    text: Text,
+    job: Job,
+) -> None:
+    container.saveText(fileName, text, job.progress)
+
+def exportShader(
+    font: Font,
+    text: Text,
+    shaderFileName: str,
+    job: Job,
+    mergeText: bool = False,
+    strategy: ShaderStrategy = Strategies['size'],
+) -> bool:
+    return writeShader(font, text, shaderFileName, mergeText, strategy, job.progress)
+
+def exportSubsetShader(
+    font: Font,
+    text: Text,
+    shaderFileName: str,
+    job: Job,
+    extra: str = NumberCharacters,
+    mergeText: bool = False,
+    strategy: ShaderStrategy = Strategies['size'],
+) -> int:
+    # Exports only the glyphs `text` and `extra` use and returns the bytes
+    # of source this saved.
+    subset = subsetFont(font, text, extra)
+    exportShader(subset, text, shaderFileName, job, mergeText, strategy)
+    return subsetSavings(font, subset, fontId(shaderFileName), strategy)
@@ -0,0 +1,326 @@
+import numpy
+from typing import Callable, Optional, Tuple
+from glyph import Glyph
+from font import Font
+from text import Text
+from export import ShaderStrategy, Strategies, shaderTables
+
+# CPU mirror of the functions generated by `export.generateShader`. Every
+# function takes broadcastable arrays of uv coordinates and evaluates the
+# same float32 arithmetic as the shader, returning -1 inside and 1 outside
+# of a glyph pixel. Only log/pow in `dFloat` depend on the GPU's precision.
+# The data tables and addressing follow the chosen `ShaderStrategy`, so all
+# strategies can be checked against each other.
+
+F32 = numpy.float32
+
+def _mod(x: numpy.ndarray, y: numpy.ndarray) -> numpy.ndarray:
+    return x - y * numpy.floor(x / y)
+
+def _uint(x: numpy.ndarray) -> numpy.ndarray:
+    # float -> uint truncates towards zero; negative values wrap like int -> uint.
+    return numpy.trunc(x).astype(numpy.int64).astype(numpy.uint32).astype(numpy.int64)
+
+def _log10(number: numpy.ndarray) -> numpy.ndarray:
+    return 1 + sum(number >= 10 ** exponent for exponent in range(1, 9))
+
+def _pow10(exponent: numpy.ndarray) -> numpy.ndarray:
+    return numpy.where(exponent <= 8, 10 ** numpy.minimum(exponent, 8), 10 ** 9)
+
+class Rasterizer:
+    def __init__(self,
+        font: Font,
+        text: Optional[Text] = None,
+        mergeText: bool = False,
+        strategy: ShaderStrategy = Strategies['size'],
+        mapping: Optional[str] = None,
+    ) -> None:
+        tables = shaderTables(font, text if text is not None else Text(), strategy, mergeText, mapping)
+        self._strategy = strategy
+        self._shape = tables['shape']
+        self._mapping = tables['mapping']
+        self._firstOrdinal = tables['firstOrdinal']
+        self._lastOrdinal = tables['lastOrdinal']
+        self._slotTable = numpy.array(tables['slotTable'], dtype=numpy.int64)
+        self._slotBits = tables['slotBits']
+        self._glyphCount = len(tables['glyphs'])
+        self._glyphStream = numpy.array(tables['glyphStream'], dtype=numpy.int64) if tables['glyphStream'] is not None else None
+        self._glyphs = numpy.array([word for ordinal, word in tables['glyphs']], dtype=numpy.int64) if self._glyphStream is None else None
+        self._textOffsets = numpy.array(tables['textOffsets'], dtype=numpy.int64)
+        self._textStrings = numpy.array(tables['textWords'], dtype=numpy.int64)
+        self._textLengths = numpy.array(tables['textLengths'] or [], dtype=numpy.int64)
+        if strategy.packedText:
+            self._textStrings = self._textStrings.reshape(-1, 4)
+
+    def _decode(self, byteIndex: numpy.ndarray) -> numpy.ndarray:
+        if len(self._textStrings) == 0:
+            return numpy.zeros_like(byteIndex)
+
+        last = len(self._textStrings) - 1
+        if self._strategy.packedText:
+            word = self._textStrings[numpy.clip(byteIndex >> 4, 0, last), (byteIndex >> 2) & 3]
+            return (word >> ((byteIndex & 3) << 3)) & 0xff
+        if self._strategy.bitwiseText:
+            word = self._textStrings[numpy.clip(byteIndex >> 2, 0, last)]
+            return (word >> ((byteIndex & 3) << 3)) & 0xff
+
+        localByteIndex = byteIndex % 4
+        word = self._textStrings[numpy.clip((byteIndex - localByteIndex) // 4, 0, last)]
+        return (word >> (8 * localByteIndex)) & 0xff
+
+    def _slot(self, ordinal: numpy.ndarray) -> numpy.ndarray:
+        index = ordinal - self._firstOrdinal
+        if self._mapping == 'index':
+            slotsPerWord = 32 // self._slotBits
+            word = self._slotTable[numpy.clip(index // slotsPerWord, 0, len(self._slotTable) - 1)]
+            return (word >> ((index % slotsPerWord) * self._slotBits)) & ((1 << self._slotBits) - 1)
+        if self._mapping == 'ranges':
+            # The first matching range wins, like the loop in the shader.
+            slot = numpy.zeros_like(ordinal)
+            for word in self._slotTable[::-1]:
+                offset = ordinal - (word & 0xff)
+                slot = numpy.where((offset >= 0) & (offset <= ((word >> 8) & 0xff)), ((word >> 16) & 0x7fff) + offset * (word >> 31), slot)
+            return slot
+        return index
+
+    def d(self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        ordinal: numpy.ndarray,
+        pixelSize: float,
+    ) -> numpy.ndarray:
+        pixelSize = F32(pixelSize)
+        x = numpy.asarray(x, dtype=F32)
+        y = numpy.asarray(y, dtype=F32)
+
+        xi = (x - _mod(x, pixelSize) + F32(.5) * pixelSize) / pixelSize
+        yi = (y - _mod(y, pixelSize) + F32(.5) * pixelSize) / pixelSize
+        ordinal = numpy.asarray(ordinal, dtype=numpy.int64)
+        index = self._slot(ordinal)
+
+        shape = self._shape
+        inside = (xi >= 0) & (yi >= 0) & (xi < shape.width) & (yi < shape.height) & (ordinal >= self._firstOrdinal) & (ordinal <= self._lastOrdinal)
+        if self._glyphStream is not None:
+            bit = index * shape.pixelCount + shape.width * (shape.height - 1 - _uint(numpy.maximum(yi, 0))) + _uint(numpy.maximum(xi, 0))
+            word = self._glyphStream[numpy.clip(bit >> 5, 0, max(len(self._glyphStream) - 1, 0))] if len(self._glyphStream) else 0
+            return numpy.where(inside & (((word >> (31 - (bit & 31))) & 1) == 1), F32(-1), F32(1))
+
+        glyphShift = 31 - shape.pixelCount
+        if self._strategy.branchlessGlyphs:
+            shift = shape.width * _uint(numpy.maximum(yi, 0)) + shape.width + glyphShift - _uint(numpy.maximum(xi, 0))
+        else:
+            shift = shape.width * (_uint(yi) + 1) + glyphShift - _uint(xi)
+        shift = numpy.clip(shift, 0, 31)
+        word = self._glyphs[numpy.clip(index, 0, max(self._glyphCount - 1, 0))] if self._glyphCount else 0
+        return numpy.where(inside & (((word >> shift) & 1) == 1), F32(-1), F32(1))
+
+    def dText(self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        index: numpy.ndarray,
+        pixelSize: float,
+    ) -> numpy.ndarray:
+        pixelSize = F32(pixelSize)
+        x = numpy.asarray(x, dtype=F32)
+        y = numpy.asarray(y, dtype=F32)
+
+        glyphSize = F32(self._shape.width + 1) * pixelSize
+        xm = _mod(x, glyphSize)
+        xi = (x - xm) / glyphSize
+
+        index = numpy.asarray(index, dtype=numpy.int64)
+        offset = self._textOffsets[index]
+        textSize = self._textLengths[index] if self._strategy.lineLengths else self._decode(offset)
+        character = self._decode(offset + _uint(xi) + 1)
+
+        outside = (xi < 0) | (xi >= textSize) | (numpy.abs(y - F32(.5 * self._shape.height) * pixelSize) > F32(self._shape.height) * pixelSize)
+        return numpy.where(outside, F32(1), self.d(xm, y, character, pixelSize))
+
+    def dUint(self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        number: numpy.ndarray,
+        pixelSize: float,
+    ) -> numpy.ndarray:
+        pixelSize = F32(pixelSize)
+        x = numpy.asarray(x, dtype=F32)
+        y = numpy.asarray(y, dtype=F32)
+        number = numpy.asarray(number, dtype=numpy.int64) & 0xffffffff
+
+        numberWidth = _log10(number) if self._strategy.digitTable else numpy.maximum(_log10(number), 1)
+        glyphSize = F32(self._shape.width + 1) * pixelSize
+        xm = _mod(x, glyphSize)
+        xi = (x - xm) / glyphSize + (10 - numberWidth).astype(F32)
+
+        digitIndex = _uint(xi)
+        if self._strategy.digitTable:
+            digit = number // _pow10(numpy.minimum((9 - digitIndex) & 0xffffffff, 9))
+        else:
+            digit = number // _pow10((9 - digitIndex) & 0xffffffff)
+
+        outside = (xi < 0) | (xi > 9) | (numpy.abs(y - F32(.5) * glyphSize) > F32(self._shape.height) * pixelSize) | (digitIndex < 10 - numberWidth)
+        return numpy.where(outside, F32(1), self.d(xm, y, 48 + digit % 10, pixelSize))
+
+    def dInt(self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        number: numpy.ndarray,
+        pixelSize: float,
+    ) -> numpy.ndarray:
+        pixelSize = F32(pixelSize)
+        x = numpy.asarray(x, dtype=F32)
+        y = numpy.asarray(y, dtype=F32)
+        number = numpy.asarray(number, dtype=numpy.int64)
+
+        glyphSize = F32(self._shape.width + 1) * pixelSize
+        xi = (x - _mod(x, glyphSize)) / glyphSize
+        negative = number < 0
+
+        return numpy.where(
+            (_uint(xi) == 0) & negative,
+            self.d(x, y, 45, pixelSize),
+            self.dUint(x - glyphSize * negative.astype(F32), y, numpy.abs(number), pixelSize),
+        )
+
+    def dFloat(self,
+        x: numpy.ndarray,
+        y: numpy.ndarray,
+        number: numpy.ndarray,
+        precision: int,
+        pixelSize: float,
+    ) -> numpy.ndarray:
+        pixelSize = F32(pixelSize)
+        x = numpy.asarray(x, dtype=F32)
+        y = numpy.asarray(y, dtype=F32)
+        number = numpy.asarray(number, dtype=F32)
+
+        glyphSize = F32(self._shape.width + 1) * pixelSize
+        xi = (x - _mod(x, glyphSize)) / glyphSize
+        before = numpy.trunc(xi) < 0
+        sign = (_uint(xi) == 0) & (number < 0)
+        signGlyph = self.d(x, y, 45, pixelSize)
+
+        x = x - glyphSize * (number < 0).astype(F32)
+        number = numpy.abs(number)
+        exponent = numpy.where(number == 0, 0, numpy.floor(numpy.log(number) / numpy.log(F32(10))).astype(numpy.int64))
+
+        xm = _mod(x, glyphSize)
+        xi = (x - xm) / glyphSize
+        column = _uint(xi)
+
+        leading = 48 + _uint(numpy.floor(number / numpy.power(F32(10), exponent.astype(F32)))) % 10
+        fraction = 48 + _uint(numpy.floor(number / numpy.power(F32(10), exponent.astype(F32) - xi + F32(1)))) % 10
+
+        result = numpy.select(
+            [column == 0, column == 1, column < precision + 1, column == precision + 1],
+            [
+                self.d(xm, y, leading, pixelSize),
+                self.d(xm, y, 46, pixelSize),
+                self.d(xm, y, fraction, pixelSize),
+                self.d(xm, y, 69, pixelSize),
+            ],
+            self.dInt(x - F32(precision + 2) * glyphSize, y, exponent, pixelSize),
+        )
+        return numpy.where(before, F32(1), numpy.where(sign, signGlyph, result))
+
+    def render(self,
+        function: Callable,
+        columns: int,
+        rows: int,
+        *arguments,
+        pixelSize: float = 1.,
+        origin: Tuple[float, float] = (0., 0.),
+    ) -> numpy.ndarray:
+        # Samples pixel centers with row 0 at the top, so the result reads
+        # like the glyph bitmaps in the editor.
+        x, y = sampleGrid(columns, rows, pixelSize, origin)
+        with numpy.errstate(all='ignore'):
+            return function(x, y, *arguments, pixelSize) < 0
+
+def sampleGrid(
+    columns: int,
+    rows: int,
+    pixelSize: float = 1.,
+    origin: Tuple[float, float] = (0., 0.),
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    x = origin[0] + (numpy.arange(columns, dtype=F32) + F32(.5)) * F32(pixelSize)
+    y = origin[1] + (numpy.arange(rows - 1, -1, -1, dtype=F32) + F32(.5)) * F32(pixelSize)
+    return x[None, :], y[:, None]
+
+if __name__ == '__main__':
+    from random import Random
+    from atlas import FontAtlas
+    from glyph import GlyphShape
+    from export import glyphSource, shaderTables, subsetFont
+
+    random = Random(1337)
+    text = Text()
+    text.add("Hello, World!")
+    text.add("-12.5E3")
+    text.add("Hello, World!")
+
+    # The default glyphs, a single uint filled up to bit 0, and bitstreams
+    # of exactly one and of several uints per glyph.
+    for shape in (Glyph.DefaultShape, GlyphShape(4, 6), GlyphShape(8, 4), GlyphShape(7, 9)):
+        font = Font(shape=shape)
+        for glyph in font.sortedGlyphs():
+            glyph.fromUnsignedInt(random.getrandbits(shape.wordBits))
+        cube = FontAtlas.fromFont(font).cube()
+        width, height = shape.width, shape.height
+
+        def expected(string: str) -> numpy.ndarray:
+            cells = [numpy.pad(cube[ord(character) - 32], ((0, 0), (0, 1))) for character in string]
+            return numpy.concatenate(cells, axis=1)
+
+        for strategy in Strategies.values():
+            for mergeText in (False, True):
+                rasterizer = Rasterizer(font, text, mergeText, strategy)
+
+                for ordinal in font.ordinals():
+                    assert (rasterizer.render(rasterizer.d, width, height, ordinal) == cube[ordinal - 32]).all()
+
+                for index, line in enumerate(text.lines()):
+                    # A binary fraction keeps float32 cell edges exact for every glyph width.
+                    bitmap = rasterizer.render(rasterizer.dText, len(line) * (width + 1), height, index, pixelSize=1 / 64)
+                    assert (bitmap == expected(line)).all()
+
+                assert (rasterizer.render(rasterizer.dUint, 5 * (width + 1), height, 12345) == expected('12345')).all()
+                assert (rasterizer.render(rasterizer.dUint, width + 1, height, 0) == expected('0')).all()
+                assert (rasterizer.render(rasterizer.dInt, 6 * (width + 1), height, -12345) == expected('-12345')).all()
+                assert (rasterizer.render(rasterizer.dFloat, 7 * (width + 1), height, -12.5, 3) == expected('-1.25E1')).all()
+
+        # Gaps and repeated glyphs, through every ordinal to slot mapping.
+        font.removeGlyph(ord('B'))
+        font.removeGlyph(ord('C'))
+        for ordinal in range(ord('a'), ord('z') + 1):
+            font.glyphWithOrdinal(ordinal).fromUnsignedInt(font.glyphWithOrdinal(ord('a')).toUnsignedInt())
+        cube[ord('B') - 32] = cube[ord('C') - 32] = False
+        cube[ord('a') - 32:ord('z') - 31] = cube[ord('a') - 32]
+
+        for mapping in ('direct', 'index', 'ranges'):
+            rasterizer = Rasterizer(font, text, mapping=mapping)
+            for ordinal in range(32, 126):
+                assert (rasterizer.render(rasterizer.d, width, height, ordinal) == cube[ordinal - 32]).all()
+            assert (rasterizer.render(rasterizer.dText, 13 * (width + 1), height, 0, pixelSize=1 / 64) == expected("Hello, World!")).all()
+
+        # Ordinals past one byte do not fit range words; the other mappings
+        # still cover them.
+        wide = font.copy()
+        for ordinal, (x, y) in ((0x2014, (0, 2)), (0x2026, (width - 1, height - 1))):
+            glyph = Glyph(ordinal, shape=font.shape())
+            glyph.toggle(x, y, True)
+            wide.addGlyph(glyph)
+        for mapping in (None, 'direct', 'index'):
+            rasterizer = Rasterizer(wide, mapping=mapping)
+            assert rasterizer._mapping != 'ranges'
+            for ordinal in (ord('A'), 0x2014, 0x2026):
+                pixels = numpy.array(wide.glyphWithOrdinal(ordinal).pixels(), dtype=bool).reshape(height, width)
+                assert (rasterizer.render(rasterizer.d, width, height, ordinal) == pixels).all()
+
+        # A subset for the text table renders the same lines.
+        rasterizer = Rasterizer(subsetFont(font, text), text)
+        assert (rasterizer.render(rasterizer.dText, 13 * (width + 1), height, 0, pixelSize=1 / 64) == expected("Hello, World!")).all()
+
+        # The export keeps the mapping with the least source.
+        sizes = {mapping: len(glyphSource(shaderTables(font, Text(), mapping=mapping), 'font')) for mapping in ('direct', 'index', 'ranges')}
+        assert Rasterizer(font)._mapping == min(sizes, key=sizes.get)
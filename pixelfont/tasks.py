@@ -0,0 +1,40 @@
+from PyQt6.QtCore import *
+from typing import Any, Callable
+from jobs import Cancelled, Job
+
+class TaskSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+class Task(QRunnable):
+    # Runs one of the `jobs` functions on a QThreadPool. The signals are
+    # emitted from the worker thread and delivered queued to receivers on
+    # the GUI thread.
+
+    def __init__(self,
+        function: Callable[..., Any],
+        *arguments: Any,
+        **keywordArguments: Any,
+    ) -> None:
+        super().__init__()
+
+        self.signals = TaskSignals()
+        self._function = function
+        self._arguments = arguments
+        self._keywordArguments = keywordArguments
+        self._job = Job(self.signals.progress.emit)
+
+    def cancel(self) -> None:
+        self._job.cancel()
+
+    def run(self) -> None:
+        try:
+            result = self._function(*self._arguments, job=self._job, **self._keywordArguments)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.failed.emit(str(error))
+        else:
+            self.signals.finished.emit(result)
@@ -1,5 +1,7 @@
 import construct
-from typing import List
+import instrument
+from typing import List, Tuple, Union
+from codec import decodeLines, encodeLines, linesToWords, mergeLines, bytesToWords
 
 class Text:
     BinarySaveFormat = construct.Aligned(
@@ -22,30 +24,74 @@ class Text:
     )
 
     def __init__(self) -> None:
-        self._lines = []
+        self._lines: List[Union[str, int]] = []
+        self._source = None
+
+    def _setSource(self, source) -> None:
+        # Lines of a mapped container stay undecoded until first access;
+        # until then their `_lines` entry is the record index in `source`.
+        self._lines = list(range(source.lineCount()))
+        self._source = source
+
+    def copy(self) -> 'Text':
+        text = Text()
+        text._lines = list(self._lines)
+        text._source = self._source
+        return text
 
     def add(self, line: str) -> None:
         self._lines.append(line)
+
+    def line(self, index: int) -> str:
+        line = self._lines[index]
+        if isinstance(line, int):
+            line = self._source.line(line)
+            self._lines[index] = line
+        return line
+
+    def lines(self) -> List[str]:
+        if self._source is not None:
+            # Edits keep ints only for untouched records, so one bulk read
+            # resolves them all.
+            decoded = self._source.lines()
+            self._lines = [decoded[line] if isinstance(line, int) else line for line in self._lines]
+            self._source = None
+        return self._lines
+
+    def insertLine(self, index: int, line: str) -> None:
+        self._lines.insert(index, line)
+
+    def setLine(self, index: int, line: str) -> None:
+        self._lines[index] = line
+
+    def removeLine(self, index: int) -> None:
+        del self._lines[index]
     
     def toBytes(self) -> bytes:
-        return Text.BinarySaveFormat.build(self._lines)
+        return encodeLines(self.lines())
 
     def fromBytes(self, data: bytes) -> None:
-        self._lines = Text.BinarySaveFormat.parse(data)
+        self._lines = decodeLines(data)
+        self._source = None
 
     def toUnsignedIntegerArray(self) -> List[int]:
-        return Text.BinaryExportFormat.parse(
-            Text.BinarySaveFormat.build(self._lines),
-        )
+        return linesToWords(self.lines())
 
     def offsets(self):
         result = []
         offset = 0
-        for line in self._lines:
+        for line in self.lines():
             result.append(offset),
             offset += len(line) + 1
         return result
 
+    def pack(self, merge: bool = False) -> Tuple[List[int], List[int]]:
+        if not merge:
+            return self.offsets(), self.toUnsignedIntegerArray()
+
+        offsets, data = mergeLines(self.lines())
+        return offsets, bytesToWords(data)
+
     def lineCount(self):
         return len(self._lines)
 
@@ -57,17 +103,25 @@ class Text:
         entireList = self.offsets()
         return [entireList[i:i + width] for i in range(0, len(entireList), width)]
 
+instrument.register(Text, 'offsets', 'pack', 'toUnsignedIntegerArray', 'chunks', 'offsetChunks', 'toBytes')
+
 if __name__ == '__main__':
     text = Text()
     text.add("Hello, World!")
     text.add("Foobar.")
     
     serialized = text.toBytes()
+    assert serialized == Text.BinarySaveFormat.build(text._lines)
+    assert text.toUnsignedIntegerArray() == list(Text.BinaryExportFormat.parse(serialized))
     
     print(serialized)
     print(text.toUnsignedIntegerArray())
     print(text.offsets())
 
+    text.add("Hello, World!")
+    offsets, words = text.pack(merge=True)
+    assert offsets[2] == offsets[0] and len(words) < len(text.toUnsignedIntegerArray())
+
     text1 = Text()
     text1.fromBytes(serialized)
 
@@ -0,0 +1,155 @@
+from PyQt6.QtCore import *
+from typing import Any, Optional
+from text import Text
+
+class TextListModel(QAbstractListModel):
+    # (row, before, after) for every edit; before is None for an inserted
+    # line and after is None for a removed one.
+    linePatched = pyqtSignal(int, object, object)
+
+    PackedSizeRole = Qt.ItemDataRole.UserRole + 1
+    FetchSize = 1024
+    # Lines are packed as ASCII behind a one byte length.
+    MaximumLineLength = 0xff
+
+    def __init__(self,
+        text: Optional[Text] = None,
+        parent: Optional[QObject] = None,
+    ) -> None:
+        super().__init__(parent)
+
+        self._text = text if text is not None else Text()
+        self._fetched = min(self._text.lineCount(), TextListModel.FetchSize)
+
+    def setText(self,
+        text: Text,
+    ) -> None:
+        self.beginResetModel()
+        self._text = text
+        self._fetched = min(self._text.lineCount(), TextListModel.FetchSize)
+        self.endResetModel()
+
+    @staticmethod
+    def isValidLine(line: str) -> bool:
+        return line.isascii() and len(line) <= TextListModel.MaximumLineLength
+
+    def text(self) -> Text:
+        return self._text
+
+    def rowCount(self,
+        parent: QModelIndex = QModelIndex(),
+    ) -> int:
+        if parent.isValid():
+            return 0
+        return self._fetched
+
+    def canFetchMore(self,
+        parent: QModelIndex = QModelIndex(),
+    ) -> bool:
+        return not parent.isValid() and self._fetched < self._text.lineCount()
+
+    def fetchMore(self,
+        parent: QModelIndex = QModelIndex(),
+    ) -> None:
+        self.fetchUpTo(min(self._fetched + TextListModel.FetchSize, self._text.lineCount()) - 1)
+
+    def fetchUpTo(self,
+        row: int,
+    ) -> None:
+        # Fetching only grows the row count; lines are decoded when the
+        # view first asks for their data.
+        row = min(row, self._text.lineCount() - 1)
+        if row < self._fetched:
+            return
+
+        self.beginInsertRows(QModelIndex(), self._fetched, row)
+        self._fetched = row + 1
+        self.endInsertRows()
+
+    def flags(self,
+        index: QModelIndex,
+    ) -> Qt.ItemFlag:
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return super().flags(index) | Qt.ItemFlag.ItemIsEditable
+
+    def data(self,
+        index: QModelIndex,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> Any:
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self._text.line(index.row())
+        if role == TextListModel.PackedSizeRole:
+            return len(self._text.line(index.row())) + 1
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return '{} bytes packed'.format(len(self._text.line(index.row())) + 1)
+        return None
+
+    def setData(self,
+        index: QModelIndex,
+        value: Any,
+        role: int = Qt.ItemDataRole.EditRole,
+    ) -> bool:
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole or not isinstance(value, str):
+            return False
+        return self.setLine(index.row(), value)
+
+    def setLine(self,
+        row: int,
+        line: str,
+    ) -> bool:
+        if row < 0 or row >= self._text.lineCount() or not TextListModel.isValidLine(line):
+            return False
+
+        before = self._text.line(row)
+        self._text.setLine(row, line)
+        if row < self._fetched:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+        self.linePatched.emit(row, before, line)
+        return True
+
+    def addLine(self,
+        line: str,
+    ) -> int:
+        # The new row, or -1 for a line that cannot be packed.
+        row = self._text.lineCount()
+        return row if self.insertLine(row, line) else -1
+
+    def insertLine(self,
+        row: int,
+        line: str,
+    ) -> bool:
+        if row < 0 or row > self._text.lineCount() or not TextListModel.isValidLine(line):
+            return False
+
+        # Rows past the fetched ones only show up once fetched.
+        if row <= self._fetched:
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._text.insertLine(row, line)
+            self._fetched += 1
+            self.endInsertRows()
+        else:
+            self._text.insertLine(row, line)
+        self.linePatched.emit(row, None, line)
+        return True
+
+    def removeLine(self,
+        row: int,
+    ) -> bool:
+        if row < 0 or row >= self._text.lineCount():
+            return False
+
+        before = self._text.line(row)
+        if row < self._fetched:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self._text.removeLine(row)
+            self._fetched -= 1
+            self.endRemoveRows()
+        else:
+            self._text.removeLine(row)
+        self.linePatched.emit(row, before, None)
+        return True
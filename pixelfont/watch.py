@@ -0,0 +1,142 @@
+from argparse import ArgumentParser
+from os import stat
+from os.path import abspath, splitext
+from threading import Event
+from time import monotonic, strftime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from export import NumberCharacters, Strategies
+from batchexport import claimOutputs, exportEntry, formatResult, loadManifest, manifestEntry
+
+# Re-exports shaders whenever their font or text table changes, e.g. for
+# live-coding setups that reload shaders on change:
+#
+#   python watch.py scenes.json
+#   python watch.py font.apf text.att -o font.frag
+#
+# Inputs are polled by mtime and size, which for a few dozen files costs
+# far less than the export itself. A burst of saves is coalesced: exports
+# start once all changed files have been quiet for the debounce time, and
+# only outputs that depend on a changed file are regenerated. A changed
+# manifest is reloaded. As in a batch export, only the first of several
+# exports to the same output is watched; the others are reported failed.
+
+DefaultInterval = .01
+DefaultDebounce = .02
+
+def fileState(fileName: str) -> Optional[Tuple[int, int]]:
+    try:
+        result = stat(fileName)
+    except OSError:
+        return None
+    return result.st_mtime_ns, result.st_size
+
+class Watcher:
+    def __init__(self,
+        entries: List[dict],
+        debounce: float = DefaultDebounce,
+    ) -> None:
+        self._entries = entries
+        self._debounce = debounce
+        self._dependents: Dict[str, List[int]] = {}
+        for index, entry in enumerate(entries):
+            for fileName in (entry['font'], entry['text']):
+                dependents = self._dependents.setdefault(abspath(fileName), [])
+                if index not in dependents:
+                    dependents.append(index)
+        self._states = {fileName: fileState(fileName) for fileName in self._dependents}
+        self._changed: Set[str] = set()
+        self._lastChange = 0.
+
+    def entries(self) -> List[dict]:
+        return self._entries
+
+    def poll(self,
+        now: float,
+    ) -> List[int]:
+        # Indices of the entries to export, once the files changed since
+        # the last export have not changed for `debounce` seconds.
+        for fileName in self._dependents:
+            state = fileState(fileName)
+            if state != self._states[fileName]:
+                self._states[fileName] = state
+                self._changed.add(fileName)
+                self._lastChange = now
+
+        if not self._changed or now - self._lastChange < self._debounce:
+            return []
+
+        affected = sorted({index for fileName in self._changed for index in self._dependents[fileName]})
+        self._changed = set()
+        return affected
+
+def watch(
+    load: Callable[[], List[dict]],
+    manifestFileName: Optional[str] = None,
+    interval: float = DefaultInterval,
+    debounce: float = DefaultDebounce,
+    report: Callable[[dict], None] = lambda result: print(strftime('%H:%M:%S ') + formatResult(result), flush=True),
+    stop: Optional[Event] = None,
+) -> None:
+    # Exports everything once, since unchanged outputs are left untouched
+    # anyway, then follows the changes until `stop` is set.
+    stop = stop or Event()
+    watcher = None
+    manifestState = None
+    while not stop.is_set():
+        if manifestFileName is not None and fileState(manifestFileName) != manifestState:
+            manifestState = fileState(manifestFileName)
+            watcher = None
+
+        if watcher is None:
+            try:
+                entries = load()
+            except Exception as error:
+                report({'output': manifestFileName, 'written': False, 'seconds': 0., 'error': '{}: {}'.format(type(error).__name__, error)})
+                stop.wait(interval)
+                continue
+            indices, rejected = claimOutputs(entries)
+            for _, result in rejected:
+                report(result)
+            watcher = Watcher([entries[index] for index in indices], debounce)
+            for entry in watcher.entries():
+                report(exportEntry(entry))
+
+        for index in watcher.poll(monotonic()):
+            report(exportEntry(watcher.entries()[index]))
+        stop.wait(interval)
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = ArgumentParser(description='Re-export ALDI pixel font shaders whenever their font or text table changes.')
+    parser.add_argument('files', nargs='+', help='A batch export manifest (.json), or a font and a text table file.')
+    parser.add_argument('-o', '--output', help='Fragment shader to write for a font and text table; defaults to the font name with a .frag extension.')
+    parser.add_argument('--merge-text', action='store_true', help='Share storage between identical lines and lines that are suffixes of others.')
+    parser.add_argument('--strategy', choices=sorted(Strategies), default='size', help='Generate the compact (size) or the fragment-speed optimized (speed) shader variant.')
+    parser.add_argument('--subset', nargs='?', const=NumberCharacters, metavar='EXTRA', help='Only export glyphs used by the text table or listed in EXTRA.')
+    parser.add_argument('--interval', type=float, default=DefaultInterval * 1000, help='Polling interval in milliseconds.')
+    parser.add_argument('--debounce', type=float, default=DefaultDebounce * 1000, help='Quiet time in milliseconds before changed files are exported.')
+    args = parser.parse_args(arguments)
+
+    if len(args.files) == 1 and splitext(args.files[0])[1].lower() == '.json':
+        manifestFileName = args.files[0]
+        load = lambda: loadManifest(manifestFileName)
+    elif len(args.files) == 2:
+        manifestFileName = None
+        entry = manifestEntry({
+            'font': args.files[0],
+            'text': args.files[1],
+            'strategy': args.strategy,
+            'mergeText': args.merge_text,
+            'subset': args.subset,
+            **({'output': args.output} if args.output else {}),
+        }, '')
+        load = lambda: [entry]
+    else:
+        parser.error('Pass a manifest or a font and a text table file.')
+
+    try:
+        watch(load, manifestFileName, args.interval / 1000, args.debounce / 1000)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()